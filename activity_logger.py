@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import queue
+import atexit
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+
+
+class ActivityLogger:
+    def __init__(self, path, flush_interval=1.0, fsync_policy="never", rotate_bytes=0,
+                 rotate_daily=False, backup_count=5, json_lines=False):
+        if fsync_policy not in ("never", "batch"):
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'.")
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.backup_count = backup_count
+        self.json_lines = json_lines
+        self._file = None
+        self._closed = False
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, message, **fields):
+        if self._closed:
+            self._write([(datetime.now(), message, fields)])
+            return
+        self._queue.put((datetime.now(), message, fields))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            records = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    record = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                records.append(record)
+            try:
+                self._write(records)
+            except OSError as e:
+                print(f"Error writing activity log: {e}")
+
+    def _format(self, timestamp, message, fields):
+        if self.json_lines:
+            return json.dumps(dict(fields, timestamp=timestamp.isoformat(), message=message), default=str) + "\n"
+        return f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n"
+
+    def _write(self, records):
+        data = "".join(self._format(*record) for record in records)
+        self._rotate_if_needed(len(data.encode()))
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync_policy == "batch":
+            os.fsync(self._file.fileno())
+
+    def _rotate_if_needed(self, incoming_bytes):
+        if not os.path.exists(self.path):
+            return
+        if self.rotate_daily:
+            file_day = datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+            if file_day != datetime.now().date():
+                self._close_file()
+                os.replace(self.path, f"{self.path}.{file_day.isoformat()}")
+                self._prune_daily()
+                return
+        if self.rotate_bytes and os.path.getsize(self.path) + incoming_bytes > self.rotate_bytes:
+            self._close_file()
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            if self.backup_count > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+
+    def _prune_daily(self):
+        # Keeps the newest backup_count dated files; ISO dates sort by age.
+        directory, name = os.path.split(os.path.abspath(self.path))
+        pattern = re.compile(re.escape(name) + r"\.\d{4}-\d{2}-\d{2}")
+        dated = sorted(entry for entry in os.listdir(directory) if pattern.fullmatch(entry))
+        for entry in dated[:max(len(dated) - self.backup_count, 0)]:
+            os.remove(os.path.join(directory, entry))
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,129 @@
+import os
+import json
+import uuid
+import tempfile
+import threading
+from decimal import Decimal
+from sqlalchemy import select, func
+import config
+from database import engine
+from models import AppMeta, Project, TimeEntry, ProjectDailyTotal
+import rollup
+
+HISTORY_GENERATION_KEY = "history_generation"
+# Ids are handed out before commit, so a short transaction can commit an entry
+# just below the watermark after a later one was folded. The fold re-reads this
+# many ids below the watermark and skips the ones it has already counted.
+FOLD_SLACK_IDS = 1000
+FOLD_FETCH_SIZE = 10000
+
+_lock = threading.Lock()
+
+
+def bump_history_generation(db):
+    # Called by writers that can change rows further below an existing watermark
+    # than FOLD_SLACK_IDS; caches built under another generation are discarded
+    # on their next run.
+    db.merge(AppMeta(key=HISTORY_GENERATION_KEY, value=uuid.uuid4().hex))
+
+
+class AnalysisCache:
+    def __init__(self, path=None):
+        self.path = path or config.ANALYSIS_CACHE_FILE
+
+    def totals(self):
+        with _lock:
+            connection = engine.connect()
+            if engine.dialect.name == 'postgresql':
+                # Watermark, rollup and delta must all come from one snapshot.
+                connection = connection.execution_options(isolation_level="REPEATABLE READ")
+            with connection:
+                with connection.begin():
+                    generation = connection.scalar(
+                        select(AppMeta.value).where(AppMeta.key == HISTORY_GENERATION_KEY)
+                    ) or ""
+                    database_url = engine.url.render_as_string(hide_password=True)
+                    state = self._load()
+                    if (state is not None and 'recent_ids' in state
+                            and state['generation'] == generation and state['database'] == database_url):
+                        self._fold(connection, state)
+                    else:
+                        state = self._from_rollup(connection)
+                        state.update(generation=generation, database=database_url)
+            self._save(state)
+            return state
+
+    def invalidate(self):
+        with _lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _from_rollup(self, connection):
+        watermark = connection.scalar(select(func.max(TimeEntry.id))) or 0
+        projects = {
+            str(project_id): [hours, cost]
+            for project_id, hours, cost in connection.execute(
+                select(ProjectDailyTotal.project_id, func.sum(ProjectDailyTotal.hours), func.sum(ProjectDailyTotal.cost))
+                .group_by(ProjectDailyTotal.project_id)
+            )
+        }
+        days = {
+            str(day)[:10]: hours
+            for day, hours in connection.execute(
+                select(ProjectDailyTotal.day, func.sum(ProjectDailyTotal.hours)).group_by(ProjectDailyTotal.day)
+            )
+        }
+        # The rollup already covers these; the next fold must not add them again.
+        recent_ids = list(connection.scalars(
+            select(TimeEntry.id).where(TimeEntry.id > watermark - FOLD_SLACK_IDS, TimeEntry.id <= watermark)
+        ))
+        return {'watermark': watermark, 'projects': projects, 'days': days, 'recent_ids': recent_ids}
+
+    def _fold(self, connection, state):
+        seen = set(state['recent_ids'])
+        for entry_id, project_id, start_time, hours, cost in connection.execute(
+            select(
+                TimeEntry.id,
+                TimeEntry.project_id,
+                TimeEntry.start_time,
+                TimeEntry.duration_hours,
+                TimeEntry.duration_hours * Project.hourly_rate
+            ).join(Project, TimeEntry.project_id == Project.id)
+            .where(TimeEntry.id > state['watermark'] - FOLD_SLACK_IDS)
+            .execution_options(yield_per=FOLD_FETCH_SIZE)
+        ):
+            if entry_id in seen:
+                continue
+            seen.add(entry_id)
+            totals = state['projects'].setdefault(str(project_id), [0, 0])
+            totals[0] += Decimal(hours)
+            totals[1] += Decimal(cost)
+            key = str(rollup.day_of(start_time))
+            state['days'][key] = state['days'].get(key, 0) + Decimal(hours)
+            state['watermark'] = max(state['watermark'], entry_id)
+        state['recent_ids'] = sorted(entry_id for entry_id in seen if entry_id > state['watermark'] - FOLD_SLACK_IDS)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        state['projects'] = {key: [Decimal(hours), Decimal(cost)] for key, (hours, cost) in state['projects'].items()}
+        state['days'] = {key: Decimal(hours) for key, hours in state['days'].items()}
+        return state
+
+    def _save(self, state):
+        data = dict(
+            state,
+            projects={key: [str(hours), str(cost)] for key, (hours, cost) in state['projects'].items()},
+            days={key: str(hours) for key, hours in state['days'].items()}
+        )
+        # A private temp file per writer, so two processes saving at once cannot
+        # interleave their output before the rename.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(data, f)
+        os.replace(f.name, self.path)
@@ -0,0 +1,366 @@
+import io
+import re
+import csv
+import json
+import asyncio
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+import config
+from catalog import catalog
+from cli import _json_default
+from time_tracker import TimeTracker
+from write_queue import write_queue
+
+MAX_BODY_BYTES = 1024 * 1024
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class StreamAborted(Exception):
+    # Raised once a streamed body has started; the only honest signal left is
+    # to drop the connection without the terminating chunk.
+    pass
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip('/') or '/'
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        return data
+
+    def user(self):
+        return self.headers.get('x-tracker-user') or self.query.get('user') or config.TRACKER_USER
+
+    def date(self, name):
+        value = self.query.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise HTTPError(400, f"invalid {name} date '{value}', expected YYYY-MM-DD")
+
+
+def _field(data, name, kind):
+    if name not in data:
+        raise HTTPError(400, f"missing field '{name}'")
+    try:
+        return kind(data[name])
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"invalid value for '{name}'")
+
+
+class ApiServer:
+    # Requests are handled on the event loop; every manager call (all of them hit
+    # the database) runs on a bounded thread pool sized to the connection pool.
+    def __init__(self, managers, host=None, port=None, workers=None):
+        self.managers = managers
+        self.host = host or config.API_HOST
+        self.port = port or config.API_PORT
+        self.executor = ThreadPoolExecutor(max_workers=workers or config.API_WORKERS, thread_name_prefix='api')
+        self.trackers = {}
+        self.trackers_lock = threading.Lock()
+        self.user_locks = {}
+        self.routes = [
+            ('GET', r'/health', self.health),
+            ('GET', r'/clients', self.list_clients),
+            ('POST', r'/clients', self.add_client),
+            ('GET', r'/projects', self.list_projects),
+            ('POST', r'/projects', self.add_project),
+            ('GET', r'/projects/(\d+)/summary', self.project_summary),
+            ('GET', r'/projects/(\d+)/invoice', self.project_invoice),
+            ('GET', r'/timers', self.list_timers),
+            ('POST', r'/timers/start', self.start_timer),
+            ('POST', r'/timers/stop', self.stop_timer),
+            ('GET', r'/analysis', self.analysis),
+            ('GET', r'/queue', self.queue_stats),
+        ]
+        self.routes = [(method, re.compile(f"^{pattern}$"), handler) for method, pattern, handler in self.routes]
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"Serving the tracker API on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    async def call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                try:
+                    await self.dispatch(request, writer)
+                except StreamAborted:
+                    break
+                except HTTPError as error:
+                    await self._send_json(writer, error.status, {'error': error.message})
+                except ConnectionError:
+                    raise
+                except Exception as error:
+                    print("API error:", error)
+                    await self._send_json(writer, 500, {'error': "internal error"})
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            await self._send_json(writer, 400, {'error': "malformed request line"})
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._send_json(writer, 400, {'error': "invalid Content-Length"})
+            return None
+        if length > MAX_BODY_BYTES:
+            await self._send_json(writer, 413, {'error': "request body too large"})
+            return None
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), target, headers, body)
+
+    async def dispatch(self, request, writer):
+        allowed = False
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            if method != request.method:
+                allowed = True
+                continue
+            result = await handler(request, writer, *match.groups())
+            if result is not None:
+                status, payload = result
+                await self._send_json(writer, status, payload)
+            return
+        if allowed:
+            raise HTTPError(405, f"{request.method} is not allowed on {request.path}")
+        raise HTTPError(404, f"no route for {request.path}")
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, default=_json_default).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def _send_stream(self, writer, content_type, chunks, headers=None):
+        # Chunked transfer encoding: the body is sent as the rows are read.
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n{extra}\r\n".encode('latin-1', errors='replace')
+        )
+        async for chunk in chunks:
+            writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _iterate_in_thread(self, rows, chunk_rows):
+        # The generator holds a database session, so it is driven by one worker
+        # thread from start to finish; a bounded queue keeps it from racing ahead
+        # of a slow client.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=4)
+        cancelled = threading.Event()
+        failed = []
+
+        def produce():
+            try:
+                buffer, pending = io.StringIO(), 0
+                csv_writer = csv.writer(buffer)
+                for row in rows:
+                    csv_writer.writerow(row)
+                    pending += 1
+                    if pending >= chunk_rows:
+                        if cancelled.is_set():
+                            return
+                        asyncio.run_coroutine_threadsafe(queue.put(buffer.getvalue().encode('utf-8')), loop).result()
+                        buffer.seek(0)
+                        buffer.truncate()
+                        pending = 0
+                if pending:
+                    asyncio.run_coroutine_threadsafe(queue.put(buffer.getvalue().encode('utf-8')), loop).result()
+            except Exception as error:
+                failed.append(error)
+                self.managers.file_handler.log_activity(f"API stream error: {error}", level="error")
+            finally:
+                rows.close()
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+        producer = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            if failed:
+                raise StreamAborted(str(failed[0]))
+        finally:
+            cancelled.set()
+            while not producer.done():
+                # Unblock a producer waiting on a full queue.
+                if queue.empty():
+                    await asyncio.sleep(0.01)
+                else:
+                    queue.get_nowait()
+            await producer
+
+    def _tracker(self, user):
+        with self.trackers_lock:
+            if user not in self.trackers:
+                self.trackers[user] = TimeTracker(self.managers.project_manager, self.managers.file_handler, user=user)
+            return self.trackers[user]
+
+    def _user_lock(self, user):
+        # Calls for one user are serialised; the TimeTracker keeps a per-user cache.
+        return self.user_locks.setdefault(user, asyncio.Lock())
+
+    async def _project(self, project_id):
+        project = await self.call(catalog.get_project, int(project_id))
+        if not project:
+            raise HTTPError(404, f"project {project_id} not found")
+        return project
+
+    async def health(self, request, writer):
+        return 200, {'status': 'ok'}
+
+    async def list_clients(self, request, writer):
+        return 200, await self.call(self.managers.client_manager.get_clients)
+
+    async def add_client(self, request, writer):
+        name = _field(request.json(), 'name', str).strip()
+        if not name:
+            raise HTTPError(400, "client name must not be empty")
+        client = await self.call(self.managers.client_manager.create_client, name)
+        if client is None:
+            raise HTTPError(409, f"client '{name}' could not be added")
+        return 201, client
+
+    async def list_projects(self, request, writer):
+        return 200, await self.call(self.managers.project_manager.get_projects)
+
+    async def add_project(self, request, writer):
+        data = request.json()
+        client_id = _field(data, 'client_id', int)
+        name = _field(data, 'name', str).strip()
+        hourly_rate = _field(data, 'hourly_rate', float)
+        project = await self.call(self.managers.project_manager.create_project, client_id, name, hourly_rate)
+        if project is None:
+            raise HTTPError(409, f"project '{name}' could not be added")
+        return 201, project
+
+    async def project_summary(self, request, writer, project_id):
+        await self._project(project_id)
+        summary = await self.call(
+            self.managers.reporter.get_project_summary, int(project_id), request.date('from'), request.date('to')
+        )
+        return 200, summary
+
+    async def project_invoice(self, request, writer, project_id):
+        project = await self._project(project_id)
+        start_date, end_date = request.date('from'), request.date('to')
+        rows = self.managers.reporter.stream_invoice(int(project_id), start_date, end_date)
+        if rows is None:
+            raise HTTPError(404, f"project {project_id} not found")
+        file_name = f"Invoice_{project['client_name']}_{project['name']}.csv".replace(' ', '')
+        await self._send_stream(
+            writer, 'text/csv', self._iterate_in_thread(rows, config.API_STREAM_CHUNK_ROWS),
+            {'Content-Disposition': f'attachment; filename="{file_name}"'}
+        )
+        return None
+
+    async def list_timers(self, request, writer):
+        user = request.user()
+        tracker = await self.call(self._tracker, user)
+        async with self._user_lock(user):
+            return 200, await self.call(tracker.get_active_timers)
+
+    async def start_timer(self, request, writer):
+        data = request.json()
+        project_id = _field(data, 'project_id', int)
+        await self._project(project_id)
+        user = request.user()
+        tracker = await self.call(self._tracker, user)
+        async with self._user_lock(user):
+            timer = await self.call(tracker.start, project_id, str(data.get('task') or ''))
+        if timer is None:
+            raise HTTPError(409, f"a timer is already running for project {project_id}")
+        if timer.get('error'):
+            raise HTTPError(503, f"timer for project {project_id} could not be started; try again shortly")
+        return 201, timer
+
+    async def stop_timer(self, request, writer):
+        project_id = _field(request.json(), 'project_id', int)
+        user = request.user()
+        tracker = await self.call(self._tracker, user)
+        async with self._user_lock(user):
+            entry = await self.call(tracker.stop, project_id)
+        if entry is None:
+            raise HTTPError(404, f"no running timer for project {project_id}")
+        if entry.get('error'):
+            raise HTTPError(503, f"timer for project {project_id} could not be stopped; try again shortly")
+        if entry.get('rejected'):
+            return 409, {'error': f"timer stopped but not logged: it {entry['rejected']}", 'conflicting_entry': entry['conflicting_entry']}
+        return 200, entry
+
+    async def analysis(self, request, writer):
+        return 200, await self.call(self.managers.reporter.get_analysis, request.date('from'), request.date('to'))
+
+    async def queue_stats(self, request, writer):
+        return 200, write_queue.stats()
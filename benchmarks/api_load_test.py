@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_suite import _percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive concurrent timer traffic against a running 'main.py serve'.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--users', type=int, default=20, help="concurrent simulated contractors")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--summary-ratio', type=float, default=0.1, help="share of iterations that also fetch a project summary")
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+class Connection:
+    # One keep-alive HTTP/1.1 connection per simulated user.
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None, user=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        headers = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if user:
+            headers += f"X-Tracker-User: {user}\r\n"
+        self.writer.write(headers.encode('latin-1') + b"\r\n" + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length, chunked = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+            elif name.lower() == 'transfer-encoding':
+                chunked = 'chunked' in value.lower()
+        if chunked:
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def simulate_user(index, args, host, port, project_ids, deadline, samples):
+    rng = random.Random(args.seed + index)
+    user = f"loadtest-{index}"
+    connection = Connection(host, port)
+
+    async def timed(name, method, path, payload=None):
+        started = time.perf_counter()
+        status = await connection.request(method, path, payload, user)
+        samples.setdefault(name, []).append((time.perf_counter() - started, status))
+
+    try:
+        while time.perf_counter() < deadline:
+            project_id = rng.choice(project_ids)
+            await timed('timer_start', 'POST', '/timers/start', {'project_id': project_id, 'task': 'load test'})
+            await timed('timer_list', 'GET', '/timers')
+            await timed('timer_stop', 'POST', '/timers/stop', {'project_id': project_id})
+            if rng.random() < args.summary_ratio:
+                await timed('project_summary', 'GET', f'/projects/{project_id}/summary')
+    finally:
+        connection.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    setup = Connection(host, port)
+    status = await setup.request('GET', '/health')
+    setup.close()
+    if status != 200:
+        raise SystemExit(f"API at {args.url} is not healthy (status {status})")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /projects HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+    response = await reader.read()
+    writer.close()
+    project_ids = [project['id'] for project in json.loads(response.split(b'\r\n\r\n', 1)[1])]
+    if not project_ids:
+        raise SystemExit("No projects to track time against; add one first.")
+
+    samples = {}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(simulate_user(i, args, host, port, project_ids, deadline, samples) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in samples.values())
+    print(f"{total} requests from {args.users} users in {elapsed:.1f}s: {total / elapsed:.1f} req/s")
+    for name, values in samples.items():
+        latencies = [latency for latency, _ in values]
+        errors = sum(1 for _, status in values if status >= 400)
+        print(f"  {name:<16} n={len(values):<7} mean {statistics.fmean(latencies) * 1000:8.2f}ms  "
+              f"p50 {_percentile(latencies, 50) * 1000:8.2f}ms  p95 {_percentile(latencies, 95) * 1000:8.2f}ms  "
+              f"p99 {_percentile(latencies, 99) * 1000:8.2f}ms  errors {errors}")
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_args()))
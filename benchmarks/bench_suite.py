@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import tracemalloc
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSERT_CHUNK_SIZE = 50000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic data and time the tracker's hot paths.")
+    parser.add_argument('--database-url', help="SQLAlchemy URL, e.g. sqlite:///bench.db or postgresql+psycopg2://...")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--projects', type=int, default=500)
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--import-rows', type=int, default=50000, help="rows in the generated JSON import file")
+    parser.add_argument('--iterations', type=int, default=20, help="samples per latency benchmark")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-generate', action='store_true', help="reuse data already in the database")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="do not trace Python allocations")
+    parser.add_argument('--workdir', help="where invoices, logs and import files are written (default: a temp dir)")
+    parser.add_argument('--results', default=os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl'), help="JSON-lines file the run is appended to")
+    parser.add_argument('--compare', help="results file to compare this run against (its last run is used)")
+    return parser.parse_args()
+
+
+def generate(args, engine):
+    from sqlalchemy import insert, func, select
+    from models import Client, Project, TimeEntry
+    from database import session_scope
+    import rollup
+
+    rng = random.Random(args.seed)
+    with engine.begin() as connection:
+        first_client = (connection.execute(select(func.max(Client.id))).scalar() or 0) + 1
+        connection.execute(insert(Client), [{'name': f"Bench Client {first_client + i}"} for i in range(args.clients)])
+        client_ids = list(connection.execute(select(Client.id).where(Client.id >= first_client)).scalars())
+        connection.execute(insert(Project), [
+            {'name': f"Bench Project {i}", 'hourly_rate': rng.choice([25, 40, 65, 80, 120]) + rng.choice([0, 0.5]), 'client_id': rng.choice(client_ids)}
+            for i in range(args.projects)
+        ])
+        project_ids = list(connection.execute(select(Project.id)).scalars())
+
+    origin = datetime.now() - timedelta(days=365 * args.years)
+    span_minutes = 365 * args.years * 24 * 60
+    written = 0
+    while written < args.entries:
+        chunk = [_random_entry(rng, project_ids, origin, span_minutes) for _ in range(min(INSERT_CHUNK_SIZE, args.entries - written))]
+        with engine.begin() as connection:
+            connection.execute(insert(TimeEntry), chunk)
+        written += len(chunk)
+        print(f"  generated {written}/{args.entries} entries", file=sys.stderr)
+
+    with session_scope() as db:
+        rollup.rebuild(db)
+    return project_ids
+
+
+def _random_entry(rng, project_ids, origin, span_minutes):
+    start = origin + timedelta(minutes=rng.randrange(span_minutes))
+    minutes = rng.randint(10, 480)
+    return {
+        'project_id': rng.choice(project_ids),
+        'task': f"Task {rng.randrange(100000)}",
+        'start_time': start,
+        'end_time': start + timedelta(minutes=minutes),
+        'duration_hours': round(minutes / 60, 4),
+    }
+
+
+def write_import_file(args, project_ids, path):
+    rng = random.Random(args.seed + 1)
+    origin = datetime.now() - timedelta(days=30)
+    with open(path, 'w') as f:
+        f.write('[')
+        for i in range(args.import_rows):
+            entry = _random_entry(rng, project_ids, origin, 30 * 24 * 60)
+            entry['start_time'] = entry['start_time'].isoformat()
+            entry['end_time'] = entry['end_time'].isoformat()
+            f.write((',' if i else '') + json.dumps(entry))
+        f.write(']')
+
+
+class Recorder:
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def measure(self, name, func, iterations=1, rows=None):
+        latencies, peak = [], 0
+        for i in range(iterations):
+            if self.trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                func(i)
+            latencies.append(time.perf_counter() - started)
+            if self.trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        total = sum(latencies)
+        stats = {
+            'samples': len(latencies),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+            'ops_per_sec': round(len(latencies) / total, 2) if total else None,
+        }
+        if rows:
+            stats['rows_per_sec'] = round(rows / total, 1) if total else None
+        if self.trace_memory:
+            stats['peak_traced_bytes'] = peak
+        self.results[name] = stats
+        print(f"  {name}: p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms", file=sys.stderr)
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        lines = [line for line in f if line.strip()]
+    baseline = json.loads(lines[-1])
+    print(f"\nComparison with run of {baseline['started_at']}:")
+    for name, stats in current['operations'].items():
+        previous = baseline['operations'].get(name)
+        if previous:
+            ratio = stats['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else float('inf')
+            print(f"  {name:<20} p50 {previous['p50_ms']:>10}ms -> {stats['p50_ms']:>10}ms ({ratio:.2f}x)")
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    workdir = args.workdir or tempfile.mkdtemp(prefix='tracker-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+    import database
+    from file_handler import FileHandler
+    from client_manager import ClientManager
+    from project_manager import ProjectManager
+    from time_tracker import TimeTracker
+    from reporter import Reporter
+    from catalog import catalog
+
+    database.init_db()
+    started_at = datetime.now().isoformat(timespec='seconds')
+    if args.skip_generate:
+        project_ids = [project['id'] for project in catalog.projects()]
+    else:
+        project_ids = generate(args, database.engine)
+        catalog.invalidate()
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        file_handler = FileHandler()
+        client_manager = ClientManager(file_handler)
+        project_manager = ProjectManager(client_manager, file_handler)
+        time_tracker = TimeTracker(project_manager, file_handler)
+        reporter = Reporter(project_manager, file_handler)
+
+    rng = random.Random(args.seed + 2)
+    # Distinct projects: a second start on the same project would fail fast
+    # ("already running") and skew the timer latencies.
+    sample = rng.sample(project_ids, min(args.iterations, len(project_ids)))
+    import_path = os.path.join(workdir, 'bench_import.json')
+    write_import_file(args, project_ids, import_path)
+
+    recorder = Recorder(trace_memory=not args.no_tracemalloc)
+    recorder.measure('import_json', lambda i: reporter.import_entries_file(import_path), rows=args.import_rows)
+    recorder.measure('project_summary', lambda i: reporter.show_project_summary(sample[i]), len(sample))
+    recorder.measure('export_invoice', lambda i: reporter.export_invoice(sample[i]), len(sample))
+    recorder.measure('analyze_data', lambda i: reporter.analyze_data(), max(1, args.iterations // 4))
+    recorder.measure('timer_start', lambda i: time_tracker.start(sample[i], 'bench'), len(sample))
+    recorder.measure('timer_stop', lambda i: time_tracker.stop(sample[i]), len(sample))
+    file_handler.activity_logger.close()
+
+    run = {
+        'started_at': started_at,
+        'backend': database.engine.dialect.name,
+        'git_commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip(),
+        'dataset': {'clients': args.clients, 'projects': args.projects, 'entries': args.entries, 'years': args.years, 'import_rows': args.import_rows, 'generated': not args.skip_generate},
+        'operations': recorder.results,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if args.compare:
+        compare(run, args.compare)
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    print(json.dumps(run, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported when an analysis actually runs.
+LAZY_MODULES = ['pandas']
+
+IMPORT_PROBE = (
+    "import sys, time; t = time.perf_counter(); import cli; "
+    "print(time.perf_counter() - t); print(','.join(m for m in {lazy!r} if m in sys.modules))"
+)
+
+
+def measure_imports(runs):
+    timings, eager = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(lazy=LAZY_MODULES)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        timings.append(float(output[0]) * 1000)
+        eager.update(m for m in output[1].split(',') if m)
+    return timings, sorted(eager)
+
+
+def measure_command(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "main.py", *shlex.split(command)],
+            cwd=REPO_ROOT, capture_output=True, check=True
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    return {'median_ms': round(statistics.median(timings), 2), 'max_ms': round(max(timings), 2), 'runs': len(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the tracker and guard against regressions.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--command', help="also time a full headless run, e.g. \"timer list\" (needs a database)")
+    parser.add_argument('--baseline', help="JSON results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown over the baseline median (fraction)")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    import_timings, eager = measure_imports(args.runs)
+    results = {'import': summarize(import_timings), 'eager_heavy_modules': eager}
+    if args.command:
+        results['command'] = dict(summarize(measure_command(args.command, args.runs)), command=args.command)
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ('import', 'command'):
+            if key in baseline and key in results:
+                limit = baseline[key]['median_ms'] * (1 + args.tolerance)
+                if results[key]['median_ms'] > limit:
+                    failures.append(f"{key} median {results[key]['median_ms']}ms exceeds {limit:.2f}ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
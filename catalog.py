@@ -0,0 +1,59 @@
+import time
+import threading
+from sqlalchemy import select
+import config
+from database import session_scope
+from models import Client, Project
+
+class Catalog:
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._clients = None
+        self._projects = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._clients = None
+            self._projects = None
+
+    def clients(self):
+        clients, _ = self._ensure_loaded()
+        return [dict(client) for client in clients.values()]
+
+    def projects(self):
+        _, projects = self._ensure_loaded()
+        return [dict(project) for project in projects.values()]
+
+    def get_project(self, project_id):
+        _, projects = self._ensure_loaded()
+        project = projects.get(project_id)
+        return dict(project) if project else None
+
+    def _ensure_loaded(self):
+        # Returns the dicts read under the lock; invalidate() may reset the
+        # attributes as soon as it is released.
+        with self._lock:
+            expired = self.ttl and time.monotonic() - self._loaded_at > self.ttl
+            if self._clients is not None and not expired:
+                return self._clients, self._projects
+            with session_scope() as db:
+                client_rows = db.execute(select(Client.id, Client.name).order_by(Client.name)).all()
+                project_rows = db.execute(
+                    select(Project.id, Project.name, Project.client_id, Client.name, Project.hourly_rate)
+                    .join(Client, Project.client_id == Client.id)
+                    .order_by(Project.name)
+                ).all()
+            self._clients = {
+                client_id: {'id': client_id, 'name': name}
+                for client_id, name in client_rows
+            }
+            self._projects = {
+                project_id: {'id': project_id, 'name': name, 'client_id': client_id, 'client_name': client_name, 'hourly_rate': hourly_rate}
+                for project_id, name, client_id, client_name, hourly_rate in project_rows
+            }
+            self._loaded_at = time.monotonic()
+            return self._clients, self._projects
+
+catalog = Catalog(ttl=config.CATALOG_TTL)
@@ -0,0 +1,305 @@
+import sys
+import json
+import argparse
+import cProfile
+import pstats
+import contextlib
+import tracemalloc
+from datetime import datetime, date
+from decimal import Decimal
+import database
+import config
+from instrumentation import instrumentation
+from write_queue import write_queue
+from file_handler import FileHandler
+from client_manager import ClientManager
+from project_manager import ProjectManager
+from time_tracker import TimeTracker
+from reporter import Reporter
+from columnar_exporter import ColumnarExporter
+import partitioning
+import overlaps
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+
+class Managers:
+    def __init__(self):
+        self.file_handler = FileHandler()
+        self.client_manager = ClientManager(self.file_handler)
+        self.project_manager = ProjectManager(self.client_manager, self.file_handler)
+        self.time_tracker = TimeTracker(self.project_manager, self.file_handler)
+        self.reporter = Reporter(self.project_manager, self.file_handler)
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _clients(managers, args):
+    if args.action == 'add':
+        return managers.client_manager.create_client(args.name)
+    return managers.client_manager.get_clients()
+
+
+def _projects(managers, args):
+    if args.action == 'add':
+        return managers.project_manager.create_project(args.client_id, args.name, args.rate)
+    return managers.project_manager.get_projects()
+
+
+def _timer(managers, args):
+    if args.action == 'start':
+        timer = managers.time_tracker.start(args.project, args.task)
+        return None if timer and timer.get('error') else timer
+    if args.action == 'stop':
+        entry = managers.time_tracker.stop(args.project)
+        return None if entry and (entry.get('rejected') or entry.get('error')) else entry
+    return managers.time_tracker.get_active_timers()
+
+
+def _summary(managers, args):
+    return managers.reporter.get_project_summary(args.project, args.date_from, args.date_to)
+
+
+def _invoice(managers, args):
+    if args.project is not None:
+        return managers.reporter.export_invoice(args.project, args.date_from, args.date_to, force=args.force)
+    return managers.reporter.export_invoices_for_period(args.date_from, args.date_to, workers=args.workers, force=args.force)
+
+
+def _import(managers, args):
+    return managers.reporter.import_entries_file(args.file, batch_size=args.batch_size, overlap_policy=args.on_overlap)
+
+
+def _load(managers, args):
+    if args.kind == 'clients':
+        return managers.client_manager.bulk_load_clients(args.file, batch_size=args.batch_size)
+    return managers.project_manager.bulk_load_projects(args.file, batch_size=args.batch_size)
+
+
+def _serve(managers, args):
+    import api
+    api.ApiServer(managers, args.host, args.port, args.workers).run()
+    return {'status': 'stopped'}
+
+
+def _sync(managers, args):
+    import sync
+    return sync.push(args.to, batch_size=args.batch_size)
+
+
+def _queue(managers, args):
+    if args.action == 'flush' and not write_queue.flush():
+        return None
+    return write_queue.stats()
+
+
+def _audit_overlaps(managers, args):
+    return managers.reporter.audit_overlaps(args.output)
+
+
+def _analyze(managers, args):
+    return managers.reporter.get_analysis(args.date_from, args.date_to)
+
+
+def _export_columnar(managers, args):
+    exporter = ColumnarExporter(managers.file_handler)
+    return exporter.export(args.format, args.output, args.chunk_size, full=args.full)
+
+
+def _month(value):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid month '{value}', expected YYYY-MM")
+
+
+def _partitions(managers, args):
+    if args.action == 'migrate':
+        return partitioning.migrate_to_partitioned(args.months_ahead)
+    if args.action == 'maintain':
+        return partitioning.maintain_partitions(args.months_ahead)
+    if args.action == 'detach':
+        return partitioning.detach_partition(args.month, drop=args.drop)
+    return partitioning.get_partitions()
+
+
+def _rollup(managers, args):
+    return managers.reporter.rebuild_rollup()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='main.py', description="Freelance Time Tracker (headless mode)")
+    parser.add_argument('--pool-stats', action='store_true', help="print connection pool statistics to stderr")
+    parser.add_argument('--metrics', metavar='PATH', help="record per-operation timings and query counts to PATH at exit")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], help="format of the metrics file")
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'], help="profile this command")
+    parser.add_argument('--profile-output', metavar='PATH', help="where to write the profile (default: profile.prof / profile.txt)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    clients = commands.add_parser('clients', help="list or add clients")
+    clients_actions = clients.add_subparsers(dest='action', required=True)
+    clients_actions.add_parser('list')
+    clients_add = clients_actions.add_parser('add')
+    clients_add.add_argument('name')
+    clients.set_defaults(handler=_clients)
+
+    projects = commands.add_parser('projects', help="list or add projects")
+    projects_actions = projects.add_subparsers(dest='action', required=True)
+    projects_actions.add_parser('list')
+    projects_add = projects_actions.add_parser('add')
+    projects_add.add_argument('--client-id', type=int, required=True)
+    projects_add.add_argument('--name', required=True)
+    projects_add.add_argument('--rate', type=float, required=True)
+    projects.set_defaults(handler=_projects)
+
+    timer = commands.add_parser('timer', help="start, stop or list timers")
+    timer_actions = timer.add_subparsers(dest='action', required=True)
+    timer_start = timer_actions.add_parser('start')
+    timer_start.add_argument('project', type=int)
+    timer_start.add_argument('--task', default='')
+    timer_stop = timer_actions.add_parser('stop')
+    timer_stop.add_argument('project', type=int)
+    timer_actions.add_parser('list')
+    timer.set_defaults(handler=_timer)
+
+    summary = commands.add_parser('summary', help="project totals")
+    summary.add_argument('--project', type=int, required=True)
+    summary.add_argument('--from', dest='date_from', type=_date)
+    summary.add_argument('--to', dest='date_to', type=_date)
+    summary.set_defaults(handler=_summary)
+
+    invoice = commands.add_parser('invoice', help="export one invoice or a billing period")
+    invoice.add_argument('--project', type=int)
+    invoice.add_argument('--from', dest='date_from', type=_date)
+    invoice.add_argument('--to', dest='date_to', type=_date)
+    invoice.add_argument('--workers', type=int)
+    invoice.add_argument('--force', action='store_true', help="rewrite invoices even if the invoice cache says they are unchanged")
+    invoice.set_defaults(handler=_invoice)
+
+    import_ = commands.add_parser('import', help="import time entries from a JSON file")
+    import_.add_argument('file')
+    import_.add_argument('--batch-size', type=int)
+    import_.add_argument('--on-overlap', choices=overlaps.POLICIES, help="what to do with entries overlapping logged time (default: OVERLAP_POLICY)")
+    import_.set_defaults(handler=_import)
+
+    load = commands.add_parser('load', help="bulk load clients or projects from a CSV/JSON file")
+    load.add_argument('kind', choices=['clients', 'projects'])
+    load.add_argument('file')
+    load.add_argument('--batch-size', type=int)
+    load.set_defaults(handler=_load)
+
+    analyze = commands.add_parser('analyze', help="hours and earnings rollups")
+    analyze.add_argument('--from', dest='date_from', type=_date)
+    analyze.add_argument('--to', dest='date_to', type=_date)
+    analyze.set_defaults(handler=_analyze)
+
+    columnar = commands.add_parser('export-columnar', help="append new time entries to a month-partitioned Parquet/Arrow dataset")
+    columnar.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    columnar.add_argument('--output', help="dataset directory (default: COLUMNAR_EXPORT_DIR)")
+    columnar.add_argument('--chunk-size', type=int)
+    columnar.add_argument('--full', action='store_true', help="discard the existing dataset and export every entry")
+    columnar.set_defaults(handler=_export_columnar)
+
+    partitions = commands.add_parser('partitions', help="monthly partitioning of time_entries (PostgreSQL)")
+    partitions_actions = partitions.add_subparsers(dest='action', required=True)
+    partitions_migrate = partitions_actions.add_parser('migrate', help="convert time_entries to a partitioned table")
+    partitions_migrate.add_argument('--months-ahead', type=int)
+    partitions_maintain = partitions_actions.add_parser('maintain', help="create partitions for the coming months")
+    partitions_maintain.add_argument('--months-ahead', type=int)
+    partitions_detach = partitions_actions.add_parser('detach', help="detach (and archive or drop) one month")
+    partitions_detach.add_argument('month', type=_month)
+    partitions_detach.add_argument('--drop', action='store_true')
+    partitions_actions.add_parser('list')
+    partitions.set_defaults(handler=_partitions)
+
+    sync = commands.add_parser('sync', help="push local clients, projects and time entries to the central database")
+    sync.add_argument('--to', help="SQLAlchemy URL of the central database (default: CENTRAL_DATABASE_URL)")
+    sync.add_argument('--batch-size', type=int)
+    sync.set_defaults(handler=_sync)
+
+    queue = commands.add_parser('queue', help="state of the timer write queue, or write it out now")
+    queue.add_argument('action', choices=['status', 'flush'], nargs='?', default='status')
+    queue.set_defaults(handler=_queue)
+
+    serve = commands.add_parser('serve', help="run the local HTTP/JSON API")
+    serve.add_argument('--host', help="interface to listen on (default: API_HOST)")
+    serve.add_argument('--port', type=int, help="port to listen on (default: API_PORT)")
+    serve.add_argument('--workers', type=int, help="threads for database work (default: API_WORKERS)")
+    serve.set_defaults(handler=_serve)
+
+    audit = commands.add_parser('audit-overlaps', help="report time entries that overlap others of the same project")
+    audit.add_argument('--output', help="CSV report path (default: OVERLAP_REPORT_FILE)")
+    audit.set_defaults(handler=_audit_overlaps)
+
+    rollup = commands.add_parser('rebuild-rollup', help="rebuild the daily reporting rollup")
+    rollup.set_defaults(handler=_rollup)
+    return parser
+
+
+def _profiled(args, handler, *handler_args):
+    if args.profile == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(handler, *handler_args)
+        finally:
+            output = args.profile_output or 'profile.prof'
+            profiler.dump_stats(output)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+            print(f"cProfile data written to {output}")
+    if args.profile == 'tracemalloc':
+        tracemalloc.start(25)
+        try:
+            return handler(*handler_args)
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            output = args.profile_output or 'profile.txt'
+            with open(output, 'w') as f:
+                f.write(f"current={current} peak={peak}\n")
+                for stat in snapshot.statistics('lineno')[:50]:
+                    f.write(f"{stat}\n")
+            print(f"Peak traced memory: {peak / 1024:.1f} KiB; top allocations written to {output}")
+    return handler(*handler_args)
+
+
+def run(argv):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'invoice' and args.project is None and (args.date_from is None or args.date_to is None):
+        parser.error("invoice needs --project or both --from and --to")
+
+    # Human-readable progress goes to stderr so stdout stays machine-readable.
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.metrics or config.INSTRUMENTATION:
+            instrumentation.enable(database.engine, output_path=args.metrics, output_format=args.metrics_format)
+        try:
+            database.init_db()
+            if config.WRITE_QUEUE or args.command == 'queue':
+                write_queue.enable()
+            result = _profiled(args, args.handler, Managers(), args)
+        except Exception as error:
+            print("Error:", error)
+            return EXIT_FAILED
+        finally:
+            if args.pool_stats:
+                print(json.dumps({'pool': database.pool_stats.snapshot()}))
+
+    if result is None:
+        return EXIT_FAILED
+    print(json.dumps(result, default=_json_default, indent=2))
+    return EXIT_OK
@@ -1,42 +1,107 @@
-from sqlalchemy.orm import Session
+import os
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from database import SessionLocal
+import config
+from database import session_scope, upsert_insert
 from models import Client
+from catalog import catalog
 from file_handler import FileHandler
+from instrumentation import instrumented
 
 class ClientManager:
     def __init__(self, file_handler: FileHandler):
         self.file_handler = file_handler
-        self.db: Session = SessionLocal()
 
     def add_client(self):
         client_name = input("Enter client name: ").strip()
-        new_client = Client(name=client_name)
+        self.create_client(client_name)
+
+    @instrumented("clients.create_client")
+    def create_client(self, client_name):
+        client_name = client_name.strip()
         if client_name == "":
             print("Invalid Name!")
-        else:
-            try:
-                self.db.add(new_client)
-                self.db.commit()
-                self.db.refresh(new_client)
-                self.file_handler.log_activity(f"Added client: {client_name} with ID {new_client.id}")
-                print(f"Client '{client_name}' added successfully.")
-            except IntegrityError:
-                self.db.rollback()
-                print("Client with this name already exists.")
-            except Exception as e:
-                self.db.rollback()
-                print("Error while adding client:", e)
+            return None
+        new_client = Client(name=client_name)
+        try:
+            with session_scope() as db:
+                db.add(new_client)
+                db.flush()
+            catalog.invalidate()
+            self.file_handler.log_activity(f"Added client: {client_name} with ID {new_client.id}")
+            print(f"Client '{client_name}' added successfully.")
+            return {'id': new_client.id, 'name': new_client.name}
+        except IntegrityError:
+            print("Client with this name already exists.")
+        except Exception as e:
+            print("Error while adding client:", e)
+        return None
+
+    def load_clients_from_file(self):
+        file_path = input("Enter the path to the CSV/JSON file of clients: ").strip()
+        self.bulk_load_clients(file_path)
+
+    @instrumented("clients.bulk_load_clients")
+    def bulk_load_clients(self, file_path, batch_size=None):
+        if not os.path.exists(file_path):
+            print(f"Error: File not found at '{file_path}'")
+            return None
+        batch_size = batch_size or config.IMPORT_BATCH_SIZE
+        rejects_path = f"{file_path}.rejected.jsonl"
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+
+        stats = {'file': file_path, 'inserted': 0, 'existing': 0, 'rejected': 0}
+        names, rejected = [], []
+        try:
+            with session_scope() as db:
+                for index, row in self.file_handler.iter_records(file_path):
+                    name = str(row.get('name') or '').strip() if isinstance(row, dict) else ''
+                    if name:
+                        names.append(name)
+                    else:
+                        rejected.append((index, "missing client name", row))
+                    if len(names) >= batch_size:
+                        self._upsert_clients(db, names, stats)
+                        names = []
+                self._upsert_clients(db, names, stats)
+        except Exception as e:
+            print("Error while loading clients:", e)
+            return None
+        finally:
+            catalog.invalidate()
+
+        if rejected:
+            self.file_handler.append_rejected_rows(rejects_path, rejected)
+            stats['rejected'] = len(rejected)
+        self.file_handler.log_activity(f"Bulk loaded clients from {file_path}: {stats['inserted']} added, {stats['existing']} already present.")
+        print(f"Loaded clients: {stats['inserted']} added, {stats['existing']} already present, {stats['rejected']} rejected.")
+        return stats
+
+    def _upsert_clients(self, db, names, stats):
+        unique_names = list(dict.fromkeys(names))
+        if not unique_names:
+            return
+        existing = set(db.scalars(select(Client.name).where(Client.name.in_(unique_names))))
+        statement = upsert_insert(Client).on_conflict_do_nothing(index_elements=['name'])
+        db.execute(statement, [{'name': name} for name in unique_names])
+        db.commit()
+        stats['inserted'] += len(unique_names) - len(existing)
+        stats['existing'] += len(existing)
+
+    @instrumented("clients.get_clients")
+    def get_clients(self):
+        return catalog.clients()
 
     def list_clients(self):
         try:
-            clients = self.db.query(Client).order_by(Client.name).all()
+            clients = self.get_clients()
             if not clients:
                 print("No clients found.")
                 return False
             print("\n--- Clients ---")
             for client in clients:
-                print(f"ID: {client.id}, Name: {client.name}")
+                print(f"ID: {client['id']}, Name: {client['name']}")
             print("---------------")
             return True
         except Exception as e:
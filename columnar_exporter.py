@@ -0,0 +1,169 @@
+import os
+import shutil
+from datetime import timezone
+from sqlalchemy import select, func
+import config
+from database import session_scope
+from models import Client, Project, TimeEntry
+from file_handler import FileHandler
+from instrumentation import instrumentation, instrumented
+
+STATE_FILE = "_state.json"
+FORMAT_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+# Ids are handed out before commit, so an entry can commit just below the
+# watermark after a later one was exported. Each run re-reads this many ids
+# below the watermark and skips the ones already in the dataset.
+WATERMARK_SLACK_IDS = 1000
+
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Columnar export needs pyarrow. Install it with 'pip install pyarrow'.")
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ('entry_id', pa.int64()),
+        ('project_id', pa.int32()),
+        ('project_name', pa.string()),
+        ('client_id', pa.int32()),
+        ('client_name', pa.string()),
+        ('task', pa.string()),
+        ('start_time', pa.timestamp('us', tz='UTC')),
+        ('end_time', pa.timestamp('us', tz='UTC')),
+        ('duration_hours', pa.decimal128(10, 4)),
+        ('hourly_rate', pa.decimal128(10, 2)),
+        ('cost', pa.decimal128(20, 6)),
+    ])
+
+
+class ColumnarExporter:
+    def __init__(self, file_handler: FileHandler):
+        self.file_handler = file_handler
+
+    @instrumented("columnar.export")
+    def export(self, output_format='parquet', output_dir=None, chunk_size=None, full=False):
+        if output_format not in FORMAT_EXTENSIONS:
+            print(f"Unknown export format '{output_format}'.")
+            return None
+        pa = _arrow()
+        schema = _schema(pa)
+        output_dir = output_dir or config.COLUMNAR_EXPORT_DIR
+        chunk_size = chunk_size or config.COLUMNAR_CHUNK_SIZE
+        state_path = os.path.join(output_dir, STATE_FILE)
+
+        if full and os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        state = self.file_handler.read_checkpoint(state_path) or {'last_id': 0, 'format': output_format, 'rows': 0, 'recent_ids': []}
+        if state['format'] != output_format:
+            print(f"'{output_dir}' holds a {state['format']} dataset; use --full to rewrite it as {output_format}.")
+            return None
+
+        buffers, written_files, row_count, buffered_rows = {}, [], 0, 0
+        last_id = state['last_id']
+        try:
+            with session_scope() as db:
+                if 'recent_ids' not in state:
+                    # Datasets written before the slack window was tracked.
+                    state['recent_ids'] = list(db.scalars(
+                        select(TimeEntry.id).where(TimeEntry.id > last_id - WATERMARK_SLACK_IDS, TimeEntry.id <= last_id)
+                    ))
+                    state['rows'] = db.scalar(select(func.count()).where(TimeEntry.id <= last_id))
+                recent_ids = set(state['recent_ids'])
+                missed = db.scalar(
+                    select(func.count()).where(TimeEntry.id <= last_id - WATERMARK_SLACK_IDS)
+                ) - (state['rows'] - sum(1 for entry_id in recent_ids if entry_id > last_id - WATERMARK_SLACK_IDS))
+                if missed > 0:
+                    message = f"{missed} time entries were committed too far below the export watermark and are not in {output_dir}; use --full to rewrite it."
+                    self.file_handler.log_activity(message, level="warning")
+                    print(message)
+                rows = db.execute(
+                    select(
+                        TimeEntry.id,
+                        TimeEntry.project_id,
+                        Project.name,
+                        Client.id,
+                        Client.name,
+                        TimeEntry.task,
+                        TimeEntry.start_time,
+                        TimeEntry.end_time,
+                        TimeEntry.duration_hours,
+                        Project.hourly_rate
+                    ).join(Project, TimeEntry.project_id == Project.id)
+                    .join(Client, Project.client_id == Client.id)
+                    .where(TimeEntry.id > last_id - WATERMARK_SLACK_IDS)
+                    .order_by(TimeEntry.id)
+                    .execution_options(yield_per=chunk_size)
+                )
+                for row in rows:
+                    if row[0] in recent_ids:
+                        continue
+                    recent_ids.add(row[0])
+                    start_time = _utc(row[6])
+                    month = start_time.strftime('%Y-%m')
+                    buffers.setdefault(month, []).append(
+                        (row[0], row[1], row[2], row[3], row[4], row[5], start_time, _utc(row[7]), row[8], row[9], row[8] * row[9])
+                    )
+                    last_id = max(last_id, row[0])
+                    row_count += 1
+                    buffered_rows += 1
+                    # Bounded across all months, not per month: entries spread
+                    # over many months would otherwise all stay in memory.
+                    if buffered_rows >= chunk_size:
+                        for month, buffered in buffers.items():
+                            written_files.append(self._write_part(pa, schema, output_dir, output_format, month, buffered))
+                        buffers, buffered_rows = {}, 0
+            for month, buffered in buffers.items():
+                written_files.append(self._write_part(pa, schema, output_dir, output_format, month, buffered))
+        except Exception as error:
+            for tmp_path in written_files:
+                os.remove(tmp_path)
+            print("Error during columnar export:", error)
+            return None
+
+        # Parts are published only once every chunk was written, so a failed
+        # run never leaves rows behind the saved watermark.
+        published = []
+        for tmp_path in written_files:
+            final_path = tmp_path[:-len('.tmp')]
+            os.replace(tmp_path, final_path)
+            published.append(final_path)
+            instrumentation.record('bytes_written', os.path.getsize(final_path))
+        instrumentation.record('rows_fetched', row_count)
+        self.file_handler.write_checkpoint(state_path, {
+            'last_id': last_id,
+            'format': output_format,
+            'rows': state['rows'] + row_count,
+            'recent_ids': sorted(entry_id for entry_id in recent_ids if entry_id > last_id - WATERMARK_SLACK_IDS)
+        })
+
+        self.file_handler.log_activity(f"Exported {row_count} time entries to {len(published)} {output_format} files in {output_dir}")
+        print(f"Exported {row_count} new time entries to {len(published)} {output_format} files in {output_dir}.")
+        return {'rows': row_count, 'files': published, 'last_id': last_id, 'format': output_format}
+
+    def _write_part(self, pa, schema, output_dir, output_format, month, rows):
+        partition_dir = os.path.join(output_dir, f"month={month}")
+        os.makedirs(partition_dir, exist_ok=True)
+        file_name = f"part-{rows[0][0]:012d}-{rows[-1][0]:012d}.{FORMAT_EXTENSIONS[output_format]}.tmp"
+        path = os.path.join(partition_dir, file_name)
+        table = pa.Table.from_arrays(
+            [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)],
+            schema=schema
+        )
+        if output_format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, path)
+        else:
+            with pa.OSFile(path, 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    writer.write_table(table)
+        return path
+
+
+def _utc(value):
+    # Naive timestamps (SQLite, timer entries) are in local time.
+    return value.astimezone(timezone.utc)
@@ -9,7 +9,72 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+POSTGRES_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# "postgresql" (the shared server) or "sqlite" (a local file for offline use).
+DB_BACKEND = os.getenv("DB_BACKEND", "postgresql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "tracker.db")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+DATABASE_URL = os.getenv("DATABASE_URL") or (f"sqlite:///{SQLITE_PATH}" if DB_BACKEND == "sqlite" else POSTGRES_URL)
+# Where 'main.py sync' pushes local entries to.
+CENTRAL_DATABASE_URL = os.getenv("CENTRAL_DATABASE_URL") or POSTGRES_URL
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "5000"))
+# Postgres session TimeZone. Naive times are local time throughout the program,
+# so by default sessions use the zone of this machine (TZ or /etc/localtime).
+DB_TIMEZONE = os.getenv("DB_TIMEZONE", "")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "0"))
+TRACKER_USER = os.getenv("TRACKER_USER") or os.getenv("USER") or "default"
 
 INVOICES_DIR = "invoices"
 ACTIVITY_LOG_FILE = "activity_log.txt"
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_FSYNC = os.getenv("LOG_FSYNC", "never")
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "false").lower() == "true"
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "4"))
+# Skip re-exporting invoices whose entries have not changed, append when only new ones were logged.
+INVOICE_CACHE = os.getenv("INVOICE_CACHE", "false").lower() == "true"
+INVOICE_CACHE_FILE = os.getenv("INVOICE_CACHE_FILE", os.path.join(INVOICES_DIR, ".invoice_index.json"))
+ANALYSIS_CACHE_FILE = os.getenv("ANALYSIS_CACHE_FILE", ".analysis_cache.json")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+COLUMNAR_EXPORT_DIR = os.getenv("COLUMNAR_EXPORT_DIR", "exports/time_entries")
+COLUMNAR_CHUNK_SIZE = int(os.getenv("COLUMNAR_CHUNK_SIZE", "50000"))
+
+# Queue timer stops in a local journal and commit them in batches (group commit).
+WRITE_QUEUE = os.getenv("WRITE_QUEUE", "false").lower() == "true"
+WRITE_QUEUE_FILE = os.getenv("WRITE_QUEUE_FILE", ".write_queue.jsonl")
+WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "0.5"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "500"))
+WRITE_QUEUE_FSYNC = os.getenv("WRITE_QUEUE_FSYNC", "true").lower() == "true"
+
+# What imports and timer stops do with time that overlaps entries of the same
+# project: "allow" (store as given), "reject" or "merge" (keep only the uncovered part).
+OVERLAP_POLICY = os.getenv("OVERLAP_POLICY", "allow").lower()
+OVERLAP_LOOKBACK_HOURS = float(os.getenv("OVERLAP_LOOKBACK_HOURS", "24"))
+OVERLAP_REPORT_FILE = os.getenv("OVERLAP_REPORT_FILE", "overlap_report.csv")
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+# Threads running database work for the API; more than the pool can serve only queue.
+API_WORKERS = int(os.getenv("API_WORKERS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+API_STREAM_CHUNK_ROWS = int(os.getenv("API_STREAM_CHUNK_ROWS", "500"))
+
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "false").lower() == "true"
+METRICS_OUTPUT = os.getenv("METRICS_OUTPUT", "metrics.json")
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "json")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
@@ -1,13 +1,288 @@
-from sqlalchemy import create_engine
+import os
+import time
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, select, update, delete, func, inspect, text, bindparam
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import DBAPIError
 import config
 
-engine = create_engine(config.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def build_engine(url):
+    options = dict(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING
+    )
+    if url.startswith('sqlite'):
+        # Pooled connections are handed between threads (API workers, exporters).
+        options['connect_args'] = {'check_same_thread': False}
+        new_engine = create_engine(url, **options)
+        event.listen(new_engine, 'connect', _configure_sqlite)
+        return new_engine
+    if url.startswith('postgresql'):
+        # Naive datetimes are written and compared as local time, so the session
+        # must interpret them in the same zone.
+        zone = config.DB_TIMEZONE or _local_timezone_name()
+        if zone:
+            options['connect_args'] = {'options': f"-c timezone={zone}"}
+    return create_engine(url, **options)
+
+def _local_timezone_name():
+    zone = os.environ.get('TZ', '').lstrip(':')
+    if zone:
+        return zone
+    path = os.path.realpath('/etc/localtime')
+    if 'zoneinfo/' in path:
+        return path.split('zoneinfo/', 1)[1]
+    return None
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers run while a writer commits; with WAL, synchronous=NORMAL
+    # only risks the last commits on power loss, never corruption.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+engine = build_engine(config.DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.sessions += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self):
+        pool = engine.pool
+        with self._lock:
+            stats = {
+                'sessions': self.sessions,
+                'total_wait_seconds': round(self.total_wait, 6),
+                'avg_wait_seconds': round(self.total_wait / self.sessions, 6) if self.sessions else 0.0,
+                'max_wait_seconds': round(self.max_wait, 6),
+            }
+        for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        return stats
+
+pool_stats = PoolStats()
+
+@contextmanager
+def session_scope():
+    db = SessionLocal()
+    try:
+        # Check the connection out eagerly so the time spent waiting on the
+        # pool is measured separately from the work done with it.
+        started = time.perf_counter()
+        db.connection()
+        pool_stats.record_wait(time.perf_counter() - started)
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Bump whenever models.py changes and add the matching step to MIGRATIONS.
+SCHEMA_VERSION = 5
+
 def init_db():
-    from models import Client, Project, TimeEntry
+    from models import AppMeta
+    current_version = get_schema_version()
+    if current_version == SCHEMA_VERSION:
+        return
+    if current_version is not None and current_version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {current_version} is newer than this program ({SCHEMA_VERSION}).")
+
+    from models import Client, Project, TimeEntry, ProjectDailyTotal, ActiveTimer
     Base.metadata.create_all(bind=engine)
+    with session_scope() as db:
+        for version in range((current_version or 0) + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version](db)
+        # After the migrations, which may add the columns new indexes refer to,
+        # and in the same transaction: the version is only written once they exist.
+        ensure_indexes(db.connection())
+        db.merge(AppMeta(key="schema_version", value=str(SCHEMA_VERSION)))
     print("Database tables checked/initialized successfully.")
+
+def get_schema_version():
+    from models import AppMeta
+    try:
+        with engine.connect() as connection:
+            value = connection.execute(select(AppMeta.value).where(AppMeta.key == "schema_version")).scalar()
+    except DBAPIError:
+        return None
+    return int(value) if value is not None else None
+
+def upsert_insert(table, dialect_name=None):
+    # INSERT ... ON CONFLICT builder for the running backend (or the named one).
+    dialect_name = dialect_name or engine.dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported on {dialect_name}.")
+    return insert(table)
+
+def ensure_indexes(connection=None):
+    # create_all skips tables that already exist, so indexes added later
+    # to a model have to be created explicitly.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection or engine, checkfirst=True)
+
+def _migrate_to_1(db):
+    # Databases created before the rollup existed need it populated once.
+    import rollup
+    from models import TimeEntry, ProjectDailyTotal
+    if not db.scalar(select(func.count()).select_from(ProjectDailyTotal)) and db.scalar(select(func.count()).select_from(TimeEntry)):
+        rollup.rebuild(db)
+
+def _migrate_to_2(db):
+    # uq_projects_client_name is created by ensure_indexes() afterwards, so
+    # existing duplicates have to go first.
+    _merge_duplicate_projects(db)
+
+def _merge_duplicate_projects(db):
+    # Projects sharing a client and a name are folded into the oldest of them;
+    # their entries and timers move over and the rollup is rebuilt.
+    import rollup
+    from models import Project, TimeEntry, ActiveTimer
+    from analysis_cache import bump_history_generation
+    survivors = {}
+    merged = {}
+    for project_id, client_id, name in db.execute(select(Project.id, Project.client_id, Project.name).order_by(Project.id)):
+        survivor_id = survivors.setdefault((client_id, name), project_id)
+        if survivor_id != project_id:
+            merged[project_id] = survivor_id
+    if not merged:
+        return
+
+    entries = TimeEntry.__table__
+    has_fingerprints = 'fingerprint' in {column['name'] for column in inspect(db.connection()).get_columns('time_entries')}
+    for duplicate_id, survivor_id in merged.items():
+        values = {'project_id': survivor_id}
+        if has_fingerprints:
+            # The fingerprint includes the project id; recomputed below.
+            values['fingerprint'] = None
+        db.execute(update(entries).where(entries.c.project_id == duplicate_id).values(**values))
+    if has_fingerprints:
+        _fingerprint_entries(db)
+
+    # A user keeps the earliest of their timers on the merged projects.
+    timers = ActiveTimer.__table__
+    kept, moved, dropped = set(), [], []
+    for timer_id, project_id, user_name in db.execute(
+        select(timers.c.id, timers.c.project_id, timers.c.user_name)
+        .where(timers.c.project_id.in_(list(merged) + list(set(merged.values()))))
+        .order_by(timers.c.start_time)
+    ):
+        key = (merged.get(project_id, project_id), user_name)
+        if key in kept:
+            dropped.append(timer_id)
+            continue
+        kept.add(key)
+        if project_id in merged:
+            moved.append({'timer_id': timer_id, 'survivor_id': key[0]})
+    if dropped:
+        db.execute(delete(timers).where(timers.c.id.in_(dropped)))
+    if moved:
+        db.execute(update(timers).where(timers.c.id == bindparam('timer_id')).values(project_id=bindparam('survivor_id')), moved)
+
+    rollup.rebuild(db)
+    bump_history_generation(db)
+    db.execute(delete(Project.__table__).where(Project.__table__.c.id.in_(list(merged))))
+    print(f"Merged {len(merged)} duplicate projects into the oldest project of the same client and name.")
+
+def _migrate_to_3(db):
+    # Fingerprint existing entries. Only the oldest copy of a duplicate gets
+    # one, so the unique index can be created afterwards.
+    if 'fingerprint' not in {column['name'] for column in inspect(db.connection()).get_columns('time_entries')}:
+        db.execute(text("ALTER TABLE time_entries ADD COLUMN fingerprint VARCHAR(64)"))
+    _fingerprint_entries(db)
+
+def _fingerprint_entries(db):
+    from models import TimeEntry
+    rows = db.execute(
+        select(TimeEntry.id, TimeEntry.project_id, TimeEntry.start_time, TimeEntry.end_time, TimeEntry.task)
+        .where(TimeEntry.fingerprint.is_(None))
+        .order_by(TimeEntry.id)
+    ).all()
+    seen = set(db.scalars(select(TimeEntry.fingerprint).where(TimeEntry.fingerprint.is_not(None))))
+    updates = []
+    for entry_id, project_id, start_time, end_time, task in rows:
+        fingerprint = TimeEntry.fingerprint_for(project_id, start_time, end_time, task)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            updates.append({'entry_id': entry_id, 'fingerprint': fingerprint})
+    if updates:
+        table = TimeEntry.__table__
+        db.execute(
+            update(table).where(table.c.id == bindparam('entry_id')).values(fingerprint=bindparam('fingerprint')),
+            updates
+        )
+
+def _migrate_to_4(db):
+    # Earlier versions stamped the schema before creating the indexes, so a
+    # database can be at version 3 without them and with rows that break them.
+    _merge_duplicate_projects(db)
+    _release_duplicate_fingerprints(db)
+    _fingerprint_entries(db)
+
+def _release_duplicate_fingerprints(db):
+    # Without uq_time_entries_fingerprint the same entry may have been stored
+    # twice; only the oldest copy keeps its fingerprint.
+    from models import TimeEntry
+    oldest = (
+        select(TimeEntry.fingerprint, TimeEntry.start_time, func.min(TimeEntry.id).label('oldest_id'))
+        .where(TimeEntry.fingerprint.is_not(None))
+        .group_by(TimeEntry.fingerprint, TimeEntry.start_time)
+        .having(func.count() > 1)
+    ).subquery()
+    entries = TimeEntry.__table__
+    db.execute(
+        update(entries)
+        .where(
+            entries.c.fingerprint == select(oldest.c.fingerprint).where(
+                oldest.c.fingerprint == entries.c.fingerprint,
+                oldest.c.start_time == entries.c.start_time,
+                oldest.c.oldest_id != entries.c.id
+            ).scalar_subquery()
+        )
+        .values(fingerprint=None)
+    )
+
+def _migrate_to_5(db):
+    # Fingerprints of naive times used to be taken from the wall-clock value;
+    # they are now taken from the UTC instant like those of aware times.
+    from models import TimeEntry
+    db.execute(update(TimeEntry.__table__).values(fingerprint=None))
+    _fingerprint_entries(db)
+
+MIGRATIONS = {
+    1: _migrate_to_1,
+    2: _migrate_to_2,
+    3: _migrate_to_3,
+    4: _migrate_to_4,
+    5: _migrate_to_5,
+}
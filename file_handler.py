@@ -2,90 +2,277 @@ import os
 import json
 import csv
 from datetime import datetime
+from decimal import Decimal
 import config
+import rollup
+from activity_logger import ActivityLogger
+from instrumentation import instrumentation, instrumented
+
+JSON_READ_CHUNK_SIZE = 1024 * 1024
+COST_SCALE = rollup.HOURS_SCALE * rollup.RATE_SCALE
 
 class FileHandler:
     def __init__(self):
         os.makedirs(config.INVOICES_DIR, exist_ok=True)
+        self.activity_logger = ActivityLogger(
+            config.ACTIVITY_LOG_FILE,
+            flush_interval=config.LOG_FLUSH_INTERVAL,
+            fsync_policy=config.LOG_FSYNC,
+            rotate_bytes=config.LOG_ROTATE_BYTES,
+            rotate_daily=config.LOG_ROTATE_DAILY,
+            backup_count=config.LOG_BACKUP_COUNT,
+            json_lines=config.LOG_JSON
+        )
         if not os.path.exists(config.ACTIVITY_LOG_FILE):
             self.log_activity("Activity Log Initialized.")
         print("File handler initialized.")
 
-    def log_activity(self, message):
-        with open(config.ACTIVITY_LOG_FILE, 'a') as f:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            f.write(f"{timestamp} - {message}\n")
+    def log_activity(self, message, **fields):
+        self.activity_logger.log(message, **fields)
 
-    def export_invoice_to_csv(self, project_details, client_name, time_entries):
+    def invoice_path(self, project_details, client_name, period=None):
         invoice_date = datetime.now().strftime('%Y%m%d')
+        if period:
+            invoice_date = f"{period[0].strftime('%Y%m%d')}-{period[1].strftime('%Y%m%d')}"
         project_name_safe = project_details['name'].replace(' ', '')
         client_name_safe = client_name.replace(' ', '')
         
         file_name = f"Invoice_{client_name_safe}_{project_name_safe}_{invoice_date}.csv"
-        file_path = os.path.join(config.INVOICES_DIR, file_name)
+        return os.path.join(config.INVOICES_DIR, file_name)
 
-        total_hours = sum(entry.duration_hours for entry in time_entries)
-        total_cost = total_hours * project_details['hourly_rate']
+    @instrumented("file.export_invoice_to_csv")
+    def export_invoice_to_csv(self, project_details, client_name, time_entries, period=None, layout=None):
+        file_path = self.invoice_path(project_details, client_name, period)
 
         try:
+            totals = {}
+            rows = self.invoice_rows(project_details, client_name, time_entries, totals)
             with open(file_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
-                
-                header = [
-                    'Project Name', 'Client', 'Invoice Date', 'Hourly Rate', 
-                    'Task Description', 'Start Time', 'End Time', 
-                    'Duration (Hours)', 'Cost', 'Total Hours', 'Total Cost'
-                ]
-                writer.writerow(header)
-
-                project_info_row = [
-                    project_details['name'],
-                    client_name,
-                    datetime.now().strftime('%Y-%m-%d'),
-                    f"${project_details['hourly_rate']:.2f}",
-                    '', '', '', '', '', '', ''
-                ]
-                writer.writerow(project_info_row)
-
-                for entry in time_entries:
-                    cost = entry.duration_hours * project_details['hourly_rate']
-                    task_row = [
-                        '', '', '', '',
-                        entry.task,
-                        entry.start_time.strftime('%Y-%m-%d %H:%M'),
-                        entry.end_time.strftime('%Y-%m-%d %H:%M'),
-                        f"{float(entry.duration_hours):.2f}",
-                        f"{float(cost):.2f}",
-                        '', ''
-                    ]
-                    writer.writerow(task_row)
-                
-                totals_row = [
-                    '', '', '', '', '', '', '', '', '',
-                    f"{float(total_hours):.2f}",
-                    f"${float(total_cost):.2f}"
-                ]
-                writer.writerow(totals_row)
+                # The totals row is written last and on its own, so its offset is
+                # known and a later append can start there.
+                previous = next(rows)
+                for row in rows:
+                    writer.writerow(previous)
+                    previous = row
+                totals_offset = csvfile.tell()
+                writer.writerow(previous)
             
+            size = os.path.getsize(file_path)
+            if layout is not None:
+                layout.update(
+                    file=file_path,
+                    entry_count=totals['entry_count'],
+                    total_units=totals['total_units'],
+                    max_id=totals['max_id'],
+                    last_start=totals['last_start'],
+                    totals_offset=totals_offset,
+                    size=size
+                )
+            instrumentation.record('rows_fetched', totals['entry_count'])
+            instrumentation.record('bytes_written', size)
             self.log_activity(f"Exported invoice for project '{project_details['name']}' to {file_path}")
             print(f"Invoice successfully exported to {file_path}")
+            return {'file': file_path, 'total_hours': totals['total_hours'], 'total_cost': totals['total_cost']}
         except IOError as e:
             print(f"Error writing to file: {e}")
+            return None
+
+    @instrumented("file.append_invoice_rows")
+    def append_invoice_rows(self, project_details, layout, time_entries):
+        # Replaces the totals row of an exported invoice with the new entries and
+        # a new totals row; layout describes the file as it was last written.
+        file_path = layout['file']
+        rate = rollup.rate_units(project_details['hourly_rate'])
+        try:
+            totals = {}
+            with open(file_path, 'r+', newline='') as csvfile:
+                csvfile.seek(layout['totals_offset'])
+                csvfile.truncate()
+                writer = csv.writer(csvfile)
+                writer.writerows(self._invoice_entry_rows(rate, time_entries, totals))
+                totals_offset = csvfile.tell()
+                total_units = layout['total_units'] + totals['total_units']
+                writer.writerow(self._invoice_totals_row(rate, total_units))
 
-    def import_json_file(self, file_path):
-        if not os.path.exists(file_path):
-            print(f"Error: File not found at '{file_path}'")
+            size = os.path.getsize(file_path)
+            instrumentation.record('rows_fetched', totals['entry_count'])
+            instrumentation.record('bytes_written', size - layout['totals_offset'])
+            layout = dict(
+                layout,
+                entry_count=layout['entry_count'] + totals['entry_count'],
+                total_units=total_units,
+                max_id=max(layout['max_id'], totals['max_id']),
+                last_start=totals['last_start'],
+                totals_offset=totals_offset,
+                size=size
+            )
+            self.log_activity(f"Added {totals['entry_count']} entries to the invoice for project '{project_details['name']}' in {file_path}")
+            print(f"Invoice {file_path} updated with {totals['entry_count']} new entries")
+            return layout
+        except IOError as e:
+            print(f"Error writing to file: {e}")
             return None
+
+    def invoice_rows(self, project_details, client_name, time_entries, totals):
+        # Yields the invoice CSV rows; totals is filled in once the last row is produced.
+        yield [
+            'Project Name', 'Client', 'Invoice Date', 'Hourly Rate', 
+            'Task Description', 'Start Time', 'End Time', 
+            'Duration (Hours)', 'Cost', 'Total Hours', 'Total Cost'
+        ]
+        yield [
+            project_details['name'],
+            client_name,
+            datetime.now().strftime('%Y-%m-%d'),
+            f"${project_details['hourly_rate']:.2f}",
+            '', '', '', '', '', '', ''
+        ]
+        rate = rollup.rate_units(project_details['hourly_rate'])
+        yield from self._invoice_entry_rows(rate, time_entries, totals)
+        yield self._invoice_totals_row(rate, totals['total_units'])
+
+    def _invoice_entry_rows(self, rate, time_entries, totals):
+        # Entries carry duration_units (1/HOURS_SCALE hour); costs are summed as
+        # integers of 1/COST_SCALE dollar and only turned into Decimals at the end.
+        total_units = 0
+        entry_count = 0
+        max_id = 0
+        last_start = None
+        for entry in time_entries:
+            units = entry.duration_units
+            total_units += units
+            entry_count += 1
+            max_id = max(max_id, entry.id)
+            last_start = entry.start_time
+            yield [
+                '', '', '', '',
+                entry.task,
+                entry.start_time.strftime('%Y-%m-%d %H:%M'),
+                entry.end_time.strftime('%Y-%m-%d %H:%M'),
+                f"{units / rollup.HOURS_SCALE:.2f}",
+                f"{units * rate / COST_SCALE:.2f}",
+                '', ''
+            ]
+
+        totals.update(
+            entry_count=entry_count,
+            total_units=total_units,
+            total_hours=Decimal(total_units) / rollup.HOURS_SCALE,
+            total_cost=Decimal(total_units * rate) / COST_SCALE,
+            max_id=max_id,
+            last_start=last_start.isoformat() if last_start else None
+        )
+
+    def _invoice_totals_row(self, rate, total_units):
+        total_hours = Decimal(total_units) / rollup.HOURS_SCALE
+        total_cost = Decimal(total_units * rate) / COST_SCALE
+        return [
+            '', '', '', '', '', '', '', '', '',
+            f"{float(total_hours):.2f}",
+            f"${float(total_cost):.2f}"
+        ]
+
+    @instrumented("file.write_invoice_manifest")
+    def write_invoice_manifest(self, period, invoices):
+        file_name = f"Manifest_{period[0].strftime('%Y%m%d')}-{period[1].strftime('%Y%m%d')}.csv"
+        file_path = os.path.join(config.INVOICES_DIR, file_name)
+        total_hours = sum(invoice['total_hours'] for invoice in invoices)
+        total_cost = sum(invoice['total_cost'] for invoice in invoices)
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            if not isinstance(data, list):
-                print("Error: JSON file should contain a list of entries.")
-                return None
-            return data
-        except json.JSONDecodeError:
-            print("Error: Could not decode JSON. Please check the file format.")
+            with open(file_path, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['Client', 'Project', 'File', 'Total Hours', 'Total Cost'])
+                for invoice in invoices:
+                    writer.writerow([
+                        invoice['client'],
+                        invoice['project'],
+                        invoice['file'],
+                        f"{float(invoice['total_hours']):.2f}",
+                        f"${float(invoice['total_cost']):.2f}"
+                    ])
+                writer.writerow(['', '', '', f"{float(total_hours):.2f}", f"${float(total_cost):.2f}"])
+            self.log_activity(f"Wrote invoice manifest for {len(invoices)} invoices to {file_path}")
+            return file_path
+        except IOError as e:
+            print(f"Error writing to file: {e}")
             return None
-        except Exception as e:
-            print(f"An unexpected error occurred while reading the file: {e}")
+
+    def iter_json_array(self, file_path, skip=0):
+        decoder = json.JSONDecoder()
+        with open(file_path, 'r') as f:
+            buffer = f.read(JSON_READ_CHUNK_SIZE).lstrip()
+            if not buffer.startswith('['):
+                raise ValueError("JSON file should contain a list of entries.")
+            pos = 1
+            eof = False
+            index = 0
+            expect_item = True
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos >= len(buffer) and not eof:
+                    chunk = f.read(JSON_READ_CHUNK_SIZE)
+                    eof = chunk == ''
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+                if pos >= len(buffer):
+                    raise ValueError("Unexpected end of JSON array.")
+                if buffer[pos] == ']':
+                    return
+                if not expect_item:
+                    if buffer[pos] != ',':
+                        raise ValueError(f"Expected ',' after entry {index - 1}.")
+                    pos += 1
+                    expect_item = True
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    complete = end < len(buffer) or eof
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    complete = False
+                if not complete:
+                    chunk = f.read(JSON_READ_CHUNK_SIZE)
+                    eof = chunk == ''
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+                if index >= skip:
+                    yield index, item
+                index += 1
+                pos = end
+                expect_item = False
+
+    def iter_records(self, file_path):
+        if file_path.lower().endswith('.csv'):
+            with open(file_path, 'r', newline='') as f:
+                for index, row in enumerate(csv.DictReader(f)):
+                    # Cells beyond the header are listed under None; missing ones are None.
+                    row.pop(None, None)
+                    yield index, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        else:
+            yield from self.iter_json_array(file_path)
+
+    def read_checkpoint(self, checkpoint_path):
+        if not os.path.exists(checkpoint_path):
             return None
+        with open(checkpoint_path, 'r') as f:
+            return json.load(f)
+
+    def write_checkpoint(self, checkpoint_path, data):
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    def clear_checkpoint(self, checkpoint_path):
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def append_rejected_rows(self, rejects_path, rejected_rows):
+        with open(rejects_path, 'a') as f:
+            for index, reason, row in rejected_rows:
+                f.write(json.dumps({'index': index, 'reason': reason, 'row': row}, default=str) + "\n")
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+import config
+
+COUNTERS = ('calls', 'wall_seconds', 'queries', 'query_seconds', 'slow_queries', 'rows_fetched', 'bytes_written')
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.output_path = config.METRICS_OUTPUT
+        self.output_format = config.METRICS_FORMAT
+        self.slow_query_seconds = config.SLOW_QUERY_MS / 1000
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.operations = {}
+
+    def enable(self, engine, output_path=None, output_format=None):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.output_path = output_path or self.output_path
+        self.output_format = output_format or self.output_format
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        atexit.register(self.dump)
+
+    @contextmanager
+    def operation(self, name):
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            with self._lock:
+                counters = self._counters(name)
+                counters['calls'] += 1
+                counters['wall_seconds'] += elapsed
+
+    def record(self, counter, value):
+        if not self.enabled:
+            return
+        # Counters are inclusive: every operation on the stack gets them.
+        with self._lock:
+            for name in set(self._stack()) or {'unattributed'}:
+                self._counters(name)[counter] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self.operations.items()}
+
+    def dump(self):
+        if not self.enabled or not self.output_path:
+            return
+        operations = self.snapshot()
+        if self.output_format == 'prometheus':
+            lines = []
+            for counter in COUNTERS:
+                metric = f"tracker_operation_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for name, counters in sorted(operations.items()):
+                    lines.append(f'{metric}{{operation="{name}"}} {counters[counter]}')
+            content = "\n".join(lines) + "\n"
+        else:
+            content = json.dumps({'generated_at': datetime.now().isoformat(), 'operations': operations}, indent=2)
+        tmp_path = f"{self.output_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, self.output_path)
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _counters(self, name):
+        if name not in self.operations:
+            self.operations[name] = dict.fromkeys(COUNTERS, 0)
+        return self.operations[name]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        self.record('queries', 1)
+        self.record('query_seconds', elapsed)
+        if elapsed >= self.slow_query_seconds:
+            self.record('slow_queries', 1)
+            self._log_slow_query(statement, elapsed)
+
+    def _log_slow_query(self, statement, elapsed):
+        operation = self._stack()[-1] if self._stack() else 'unattributed'
+        line = json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'operation': operation,
+            'duration_ms': round(elapsed * 1000, 3),
+            'statement': " ".join(statement.split()),
+        })
+        with self._lock:
+            with open(config.SLOW_QUERY_LOG, 'a') as f:
+                f.write(line + "\n")
+
+
+instrumentation = Instrumentation()
+
+
+def instrumented(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            with instrumentation.operation(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+import os
+import json
+import threading
+import config
+
+# Index of exported invoice files. Each entry records what went into the file:
+# entry count, highest entry id, billed hours (1/HOURS_SCALE hour), the rate,
+# the start time of the last row and the byte offset of the totals row. An
+# export whose entry set still has the same fingerprint is skipped; when only
+# newer entries were added the file is extended in place. Edits that keep the
+# count, the highest id and the hours (a changed task text) are not noticed;
+# use --force for those.
+
+
+class InvoiceCache:
+    def __init__(self, path=None):
+        self.path = path or config.INVOICE_CACHE_FILE
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(project_id, period):
+        if period:
+            return f"{project_id}:{period[0]}:{period[1]}"
+        return f"{project_id}:all"
+
+    def get(self, key, file_path):
+        # Only entries whose file is still the one that was written count.
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry or entry['file'] != file_path:
+            return None
+        try:
+            if os.path.getsize(file_path) != entry['size']:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._load()[key] = entry
+
+    def save(self):
+        with self._lock:
+            if self._entries is None:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self._entries = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    pass
+        return self._entries
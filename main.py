@@ -1,4 +1,8 @@
+import sys
 import database
+import config
+from instrumentation import instrumentation
+from write_queue import write_queue
 from file_handler import FileHandler
 from client_manager import ClientManager
 from project_manager import ProjectManager
@@ -7,7 +11,11 @@ from reporter import Reporter
 from ui import UIManager
 
 def main():
+    if config.INSTRUMENTATION:
+        instrumentation.enable(database.engine)
     database.init_db()
+    if config.WRITE_QUEUE:
+        write_queue.enable()
     file_handler = FileHandler()
     
     client_manager = ClientManager(file_handler)
@@ -19,4 +27,7 @@ def main():
     ui.main_menu()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        import cli
+        sys.exit(cli.run(sys.argv[1:]))
     main()
@@ -1,8 +1,26 @@
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Text
+import hashlib
+from datetime import timezone
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Date, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# Naive datetimes are local time: timers use datetime.now(), SQLite stores the
+# wall clock and Postgres sessions run in the local zone (database.build_engine).
+# Comparisons and fingerprints use naive UTC; query parameters go back to local.
+def utc_naive(value):
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_naive(value):
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def storage_time(value):
+    # What an input time is written as: SQLite would silently drop an offset.
+    return local_naive(utc_naive(value))
+
+
 class Client(Base):
     __tablename__ = "clients"
     id = Column(Integer, primary_key=True, index=True)
@@ -17,6 +35,9 @@ class Project(Base):
     client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
     client = relationship("Client", back_populates="projects")
     time_entries = relationship("TimeEntry", back_populates="project")
+    __table_args__ = (
+        Index("uq_projects_client_name", "client_id", "name", unique=True),
+    )
 
 class TimeEntry(Base):
     __tablename__ = "time_entries"
@@ -26,4 +47,41 @@ class TimeEntry(Base):
     end_time = Column(DateTime(timezone=True), nullable=False)
     duration_hours = Column(Numeric(10, 4), nullable=False)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    project = relationship("Project", back_populates="time_entries")
\ No newline at end of file
+    fingerprint = Column(String(64))
+    project = relationship("Project", back_populates="time_entries")
+    __table_args__ = (
+        Index("ix_time_entries_project_start", "project_id", "start_time"),
+        # start_time is part of the key so the index also works on the partitioned table.
+        Index("uq_time_entries_fingerprint", "fingerprint", "start_time", unique=True),
+    )
+
+    @staticmethod
+    def fingerprint_for(project_id, start_time, end_time, task):
+        key = "\x1f".join([str(project_id), utc_naive(start_time).isoformat(), utc_naive(end_time).isoformat(), task or ""])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class ProjectDailyTotal(Base):
+    __tablename__ = "project_daily_totals"
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hours = Column(Numeric(16, 4), nullable=False, default=0)
+    cost = Column(Numeric(18, 6), nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+
+class ActiveTimer(Base):
+    __tablename__ = "active_timers"
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    user_name = Column(String, nullable=False, index=True)
+    task = Column(Text)
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    __table_args__ = (
+        UniqueConstraint("project_id", "user_name", name="uq_active_timers_project_user"),
+    )
+
+
+class AppMeta(Base):
+    __tablename__ = "app_meta"
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
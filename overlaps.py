@@ -0,0 +1,198 @@
+import csv
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import select
+import config
+from models import TimeEntry, utc_naive, local_naive
+from rollup import HOURS_QUANTUM
+
+# Overlap checks for time entries of the same project. Entries carry no user,
+# so "the same person twice" cannot be told apart from "two people on one
+# project"; checks are per project. Intervals are half-open: an entry ending
+# at 10:00 does not overlap one starting at 10:00. All times are compared in
+# UTC (naive ones are local time, see models.utc_naive).
+
+POLICIES = ('allow', 'reject', 'merge')
+AUDIT_FETCH_SIZE = 10000
+REPORT_FIELDS = ['project_id', 'entry_id', 'start_time', 'end_time', 'overlaps_entry_id',
+                 'other_start_time', 'other_end_time', 'overlap_hours']
+
+
+class CoveredIntervals:
+    # Sorted, disjoint [start, end) intervals with O(log n) lookups.
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    @classmethod
+    def from_sorted(cls, intervals):
+        covered = cls()
+        for start, end in intervals:
+            if covered.starts and start <= covered.ends[-1]:
+                covered.ends[-1] = max(covered.ends[-1], end)
+            else:
+                covered.starts.append(start)
+                covered.ends.append(end)
+        return covered
+
+    def first_overlap(self, start, end):
+        position = bisect_right(self.starts, start) - 1
+        if position >= 0 and self.ends[position] > start:
+            return self.starts[position], self.ends[position]
+        position += 1
+        if position < len(self.starts) and self.starts[position] < end:
+            return self.starts[position], self.ends[position]
+        return None
+
+    def gaps(self, start, end):
+        pieces, cursor = [], start
+        position = max(bisect_right(self.starts, start) - 1, 0)
+        while position < len(self.starts) and self.starts[position] < end:
+            if self.ends[position] > cursor:
+                if self.starts[position] > cursor:
+                    pieces.append((cursor, self.starts[position]))
+                cursor = max(cursor, self.ends[position])
+            position += 1
+        if cursor < end:
+            pieces.append((cursor, end))
+        return pieces
+
+    def add(self, start, end):
+        position = bisect_right(self.starts, start)
+        if position > 0 and self.ends[position - 1] >= start:
+            position -= 1
+            start = self.starts[position]
+        last = position
+        while last < len(self.starts) and self.starts[last] <= end:
+            end = max(end, self.ends[last])
+            last += 1
+        self.starts[position:last] = [start]
+        self.ends[position:last] = [end]
+
+
+class OverlapChecker:
+    def __init__(self, db, policy=None, lookback_hours=None):
+        self.db = db
+        self.policy = policy or config.OVERLAP_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown overlap policy '{self.policy}'.")
+        self.lookback = timedelta(hours=lookback_hours or config.OVERLAP_LOOKBACK_HOURS)
+
+    def check(self, rows):
+        # For each row, in input order: (pieces, reason). Pieces are the rows to
+        # write: the row itself, clipped parts of it (merge) or none; reason is
+        # set when the row was rejected.
+        results = [([row], None) for row in rows]
+        if self.policy == 'allow' or not rows:
+            return results
+        by_project = defaultdict(list)
+        for position, row in enumerate(rows):
+            by_project[row['project_id']].append(position)
+
+        for project_id, positions in by_project.items():
+            positions.sort(key=lambda position: (utc_naive(rows[position]['start_time']), utc_naive(rows[position]['end_time'])))
+            first = utc_naive(rows[positions[0]]['start_time'])
+            last = max(utc_naive(rows[position]['end_time']) for position in positions)
+            covered = CoveredIntervals.from_sorted(
+                (utc_naive(start), utc_naive(end)) for start, end in self._existing(project_id, first, last)
+            )
+            for position in positions:
+                row = rows[position]
+                start, end = utc_naive(row['start_time']), utc_naive(row['end_time'])
+                if end <= start:
+                    continue
+                if self.policy == 'reject':
+                    conflict = covered.first_overlap(start, end)
+                    if conflict:
+                        results[position] = ([], f"overlaps time already logged from {conflict[0]} to {conflict[1]}")
+                        continue
+                    covered.add(start, end)
+                else:
+                    pieces = covered.gaps(start, end)
+                    if pieces != [(start, end)]:
+                        results[position] = ([_clip(row, piece_start, piece_end) for piece_start, piece_end in pieces], None)
+                    covered.add(start, end)
+        return results
+
+    def first_conflict(self, project_id, start_time, end_time):
+        # The earliest stored entry of the project overlapping [start_time, end_time).
+        start, end = utc_naive(start_time), utc_naive(end_time)
+        row = self.db.execute(
+            select(TimeEntry.id, TimeEntry.task, TimeEntry.start_time, TimeEntry.end_time)
+            .where(
+                TimeEntry.project_id == project_id,
+                TimeEntry.start_time >= local_naive(start - self.lookback),
+                TimeEntry.start_time < local_naive(end),
+                TimeEntry.end_time > local_naive(start)
+            )
+            .order_by(TimeEntry.start_time)
+            .limit(1)
+        ).mappings().first()
+        return dict(row) if row else None
+
+    def _existing(self, project_id, first, last):
+        # Index range on (project_id, start_time); entries that started more than
+        # OVERLAP_LOOKBACK_HOURS before the window are not considered.
+        return self.db.execute(
+            select(TimeEntry.start_time, TimeEntry.end_time)
+            .where(
+                TimeEntry.project_id == project_id,
+                TimeEntry.start_time >= local_naive(first - self.lookback),
+                TimeEntry.start_time < local_naive(last),
+                TimeEntry.end_time > local_naive(first)
+            )
+            .order_by(TimeEntry.start_time)
+        ).all()
+
+
+def _clip(row, start, end):
+    # The clipped part keeps the row's ratio of billed hours to elapsed time;
+    # its times are written as local time like every other input (models.storage_time).
+    start, end = local_naive(start), local_naive(end)
+    elapsed = (row['end_time'] - row['start_time']).total_seconds()
+    share = Decimal(str((end - start).total_seconds() / elapsed))
+    duration = (Decimal(str(row['duration_hours'])) * share).quantize(HOURS_QUANTUM, rounding=ROUND_HALF_UP)
+    clipped = dict(row, start_time=start, end_time=end, duration_hours=duration)
+    if 'fingerprint' in row:
+        clipped['fingerprint'] = TimeEntry.fingerprint_for(row['project_id'], start, end, row['task'])
+    return clipped
+
+
+def audit(db, report_path=None, fetch_size=None):
+    # One pass over all entries in (project_id, start_time) order. Per project
+    # only the entry reaching furthest so far is kept, so memory stays constant.
+    report_path = report_path or config.OVERLAP_REPORT_FILE
+    lookback = timedelta(hours=config.OVERLAP_LOOKBACK_HOURS)
+    stats = {'report': report_path, 'entries_scanned': 0, 'overlaps': 0, 'overlap_hours': 0.0,
+             'projects_affected': 0, 'entries_longer_than_lookback': 0}
+    affected = set()
+    rows = db.execute(
+        select(TimeEntry.id, TimeEntry.project_id, TimeEntry.start_time, TimeEntry.end_time)
+        .order_by(TimeEntry.project_id, TimeEntry.start_time)
+        .execution_options(yield_per=fetch_size or AUDIT_FETCH_SIZE)
+    )
+    with open(report_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_FIELDS)
+        current_project, reach = None, None
+        for entry_id, project_id, start_time, end_time in rows:
+            stats['entries_scanned'] += 1
+            if end_time - start_time > lookback:
+                stats['entries_longer_than_lookback'] += 1
+            if project_id != current_project:
+                current_project, reach = project_id, (entry_id, start_time, end_time)
+                continue
+            other_id, other_start, other_end = reach
+            if start_time < other_end:
+                overlap = (min(end_time, other_end) - start_time).total_seconds() / 3600
+                writer.writerow([project_id, entry_id, start_time, end_time, other_id, other_start, other_end, f"{overlap:.4f}"])
+                stats['overlaps'] += 1
+                stats['overlap_hours'] += overlap
+                affected.add(project_id)
+            if end_time > other_end:
+                reach = (entry_id, start_time, end_time)
+    stats['overlap_hours'] = round(stats['overlap_hours'], 4)
+    stats['projects_affected'] = len(affected)
+    return stats
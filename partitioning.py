@@ -0,0 +1,153 @@
+from datetime import date
+from sqlalchemy import text
+import config
+from database import engine, Base
+
+# Monthly RANGE partitioning of time_entries by start_time (Postgres only).
+# Partitioned tables cannot have a primary key without the partition key,
+# so the migrated table's key is (id, start_time); ids still come from the
+# original sequence and stay unique.
+
+PARENT_TABLE = "time_entries"
+UNPARTITIONED_TABLE = "time_entries_unpartitioned"
+
+
+def _require_postgres():
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError("Partitioning of time_entries is only supported on PostgreSQL.")
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def _months_between(first, last):
+    month = _month(first)
+    while month <= _month(last):
+        yield month
+        month = _next_month(month)
+
+
+def is_partitioned(connection):
+    return bool(connection.scalar(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {'table': PARENT_TABLE}))
+
+
+def list_partitions(connection):
+    rows = connection.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {'table': PARENT_TABLE})
+    return [{'name': name, 'bounds': bounds} for name, bounds in rows]
+
+
+def get_partitions():
+    _require_postgres()
+    with engine.connect() as connection:
+        return list_partitions(connection)
+
+
+def _create_partition(connection, month):
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    ))
+
+
+def migrate_to_partitioned(months_ahead=None):
+    _require_postgres()
+    months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            print("time_entries is already partitioned.")
+            return None
+        connection.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+        first, last = connection.execute(text(f"SELECT min(start_time), max(start_time) FROM {PARENT_TABLE}")).one()
+        today = date.today()
+        first = first or today
+        last = max(last.date() if last else today, today)
+        for _ in range(months_ahead):
+            last = _next_month(_month(last))
+
+        sequence = connection.scalar(text(f"SELECT pg_get_serial_sequence('{PARENT_TABLE}', 'id')"))
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {UNPARTITIONED_TABLE}"))
+        connection.execute(text(
+            f"CREATE TABLE {PARENT_TABLE} (LIKE {UNPARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (start_time)"
+        ))
+        for month in _months_between(first, last):
+            _create_partition(connection, month)
+        row_count = connection.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {UNPARTITIONED_TABLE}")).rowcount
+        if sequence:
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        connection.execute(text(f"DROP TABLE {UNPARTITIONED_TABLE}"))
+        if sequence:
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, start_time)"))
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD FOREIGN KEY (project_id) REFERENCES projects (id)"))
+        for index in Base.metadata.tables[PARENT_TABLE].indexes:
+            index.create(bind=connection)
+        partitions = len(list_partitions(connection))
+    print(f"Migrated {row_count} time entries into {partitions} monthly partitions.")
+    return {'rows': row_count, 'partitions': partitions}
+
+
+def ensure_partitions(first, last=None, connection=None):
+    last = last or first
+    if connection is None:
+        if engine.dialect.name != 'postgresql':
+            return []
+        with engine.begin() as connection:
+            return ensure_partitions(first, last, connection)
+    if connection.dialect.name != 'postgresql' or not is_partitioned(connection):
+        return []
+    existing = {partition['name'] for partition in list_partitions(connection)}
+    created = []
+    for month in _months_between(first, last):
+        if partition_name(month) not in existing:
+            _create_partition(connection, month)
+            created.append(partition_name(month))
+    return created
+
+
+def maintain_partitions(months_ahead=None):
+    _require_postgres()
+    months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    last = date.today()
+    for _ in range(months_ahead):
+        last = _next_month(_month(last))
+    created = ensure_partitions(date.today(), last)
+    print(f"Created {len(created)} partitions." if created else "All partitions already exist.")
+    return {'created': created}
+
+
+def detach_partition(month, drop=False):
+    _require_postgres()
+    name = partition_name(month)
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block, and it
+    # only takes a SHARE UPDATE EXCLUSIVE lock on the parent table.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if name not in {partition['name'] for partition in list_partitions(connection)}:
+            print(f"No attached partition named {name}.")
+            return None
+        connection.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}" CONCURRENTLY'))
+        if drop:
+            connection.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            connection.execute(text(f'ALTER TABLE "{name}" RENAME TO "archived_{name}"'))
+    archived = None if drop else f"archived_{name}"
+    print(f"Detached {name}" + (" and dropped it." if drop else f"; kept as {archived}."))
+    return {'partition': name, 'dropped': drop, 'archived_table': archived}
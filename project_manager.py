@@ -1,15 +1,38 @@
-from sqlalchemy.orm import Session
+import os
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import select, tuple_
 from sqlalchemy.exc import IntegrityError
-from database import SessionLocal
-from models import Project
+import config
+import rollup
+from database import session_scope, upsert_insert
+from models import Client, Project
+from analysis_cache import bump_history_generation
+from catalog import catalog
 from client_manager import ClientManager
 from file_handler import FileHandler
+from instrumentation import instrumented
+
+# hourly_rate is Numeric(10, 2).
+MAX_HOURLY_RATE = Decimal('100000000')
+MAX_ID = 2 ** 31 - 1
+
+
+def _client_id(value):
+    # File values may be any JSON type; only whole numbers in the id range count.
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdecimal():
+            return None
+    value = int(value)
+    return value if 0 < value <= MAX_ID else None
+
 
 class ProjectManager:
     def __init__(self, client_manager: ClientManager, file_handler: FileHandler):
         self.client_manager = client_manager
         self.file_handler = file_handler
-        self.db: Session = SessionLocal()
 
     def add_project(self):
         if not self.client_manager.list_clients():
@@ -29,28 +52,158 @@ class ProjectManager:
             print("Invalid hourly rate. Please enter a number.")
             return
 
+        self.create_project(client_id, project_name, hourly_rate)
+
+    @instrumented("projects.create_project")
+    def create_project(self, client_id, project_name, hourly_rate):
         new_project = Project(name=project_name, hourly_rate=hourly_rate, client_id=client_id)
         try:
-            self.db.add(new_project)
-            self.db.commit()
+            with session_scope() as db:
+                db.add(new_project)
+                db.flush()
+            catalog.invalidate()
             self.file_handler.log_activity(f"Added project: {project_name} for client ID {client_id}")
             print(f"Project '{project_name}' added successfully.")
+            return {'id': new_project.id, 'name': project_name, 'client_id': client_id, 'hourly_rate': new_project.hourly_rate}
         except IntegrityError:
-            self.db.rollback()
-            print("Error: A database integrity issue occurred. Please ensure the Client ID is valid.")
+            # Either the client does not exist or it already has a project of this name.
+            with session_scope() as db:
+                client_exists = db.get(Client, client_id) is not None
+            if not client_exists:
+                print(f"Error: Client ID {client_id} does not exist.")
+            else:
+                print(f"Error: Client ID {client_id} already has a project named '{project_name}'.")
         except Exception as e:
-            self.db.rollback()
             print("Error while adding project:", e)
+        return None
+
+    def load_projects_from_file(self):
+        file_path = input("Enter the path to the CSV/JSON file of projects: ").strip()
+        self.bulk_load_projects(file_path)
+
+    @instrumented("projects.bulk_load_projects")
+    def bulk_load_projects(self, file_path, batch_size=None):
+        # Rows need name, hourly_rate and either client_id or client (a client name).
+        # Existing (client, name) pairs get their rate updated.
+        if not os.path.exists(file_path):
+            print(f"Error: File not found at '{file_path}'")
+            return None
+        batch_size = batch_size or config.IMPORT_BATCH_SIZE
+        rejects_path = f"{file_path}.rejected.jsonl"
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+
+        stats = {'file': file_path, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+        batch = []
+        try:
+            with session_scope() as db:
+                for index, row in self.file_handler.iter_records(file_path):
+                    batch.append((index, row))
+                    if len(batch) >= batch_size:
+                        self._upsert_projects(db, batch, stats, rejects_path)
+                        batch = []
+                self._upsert_projects(db, batch, stats, rejects_path)
+        except Exception as e:
+            print("Error while loading projects:", e)
+            return None
+        finally:
+            catalog.invalidate()
+
+        self.file_handler.log_activity(
+            f"Bulk loaded projects from {file_path}: {stats['inserted']} added, {stats['updated']} re-rated."
+        )
+        print(f"Loaded projects: {stats['inserted']} added, {stats['updated']} re-rated, "
+              f"{stats['unchanged']} unchanged, {stats['rejected']} rejected.")
+        return stats
+
+    def _upsert_projects(self, db, batch, stats, rejects_path):
+        if not batch:
+            return
+        client_names = {str(row['client']).strip() for _, row in batch
+                        if isinstance(row, dict) and not row.get('client_id') and row.get('client')}
+        client_ids = {_client_id(row['client_id']) for _, row in batch if isinstance(row, dict) and row.get('client_id')}
+        client_ids.discard(None)
+        by_name = dict(db.execute(select(Client.name, Client.id).where(Client.name.in_(client_names))).all()) if client_names else {}
+        known_ids = set(db.scalars(select(Client.id).where(Client.id.in_(client_ids)))) if client_ids else set()
+
+        values, rejected = {}, []
+        for index, row in batch:
+            if not isinstance(row, dict):
+                rejected.append((index, "row is not an object", row))
+                continue
+            name = str(row.get('name') or '').strip()
+            if not name:
+                rejected.append((index, "missing project name", row))
+                continue
+            if row.get('client_id'):
+                client_id = _client_id(row['client_id'])
+                if client_id is None:
+                    rejected.append((index, f"invalid client_id {row['client_id']!r}", row))
+                    continue
+                if client_id not in known_ids:
+                    rejected.append((index, f"unknown client_id {row['client_id']!r}", row))
+                    continue
+            else:
+                client_id = by_name.get(str(row.get('client') or '').strip())
+                if client_id is None:
+                    rejected.append((index, f"unknown client {row.get('client')!r}", row))
+                    continue
+            try:
+                hourly_rate = Decimal(str(row.get('hourly_rate')))
+            except (InvalidOperation, ValueError):
+                hourly_rate = None
+            # NaN and Infinity parse, but cannot be compared or stored.
+            if hourly_rate is None or not hourly_rate.is_finite() or hourly_rate < 0 or hourly_rate >= MAX_HOURLY_RATE:
+                rejected.append((index, "invalid hourly_rate", row))
+                continue
+            hourly_rate = hourly_rate.quantize(Decimal('0.01'))
+            # Last row wins when a file repeats a project.
+            values[(client_id, name)] = hourly_rate
+
+        if values:
+            current = {
+                (client_id, name): (project_id, rate)
+                for project_id, client_id, name, rate in db.execute(
+                    select(Project.id, Project.client_id, Project.name, Project.hourly_rate)
+                    .where(tuple_(Project.client_id, Project.name).in_(list(values)))
+                )
+            }
+            statement = upsert_insert(Project)
+            statement = statement.on_conflict_do_update(
+                index_elements=['client_id', 'name'],
+                set_={'hourly_rate': statement.excluded.hourly_rate}
+            )
+            db.execute(statement, [
+                {'client_id': client_id, 'name': name, 'hourly_rate': rate}
+                for (client_id, name), rate in values.items()
+            ])
+
+            repriced = [current[key][0] for key, rate in values.items() if key in current and current[key][1] != rate]
+            if repriced:
+                rollup.reprice(db, repriced)
+                bump_history_generation(db)
+            stats['inserted'] += sum(1 for key in values if key not in current)
+            stats['updated'] += len(repriced)
+            stats['unchanged'] += sum(1 for key in values if key in current) - len(repriced)
+        db.commit()
+
+        if rejected:
+            self.file_handler.append_rejected_rows(rejects_path, rejected)
+            stats['rejected'] += len(rejected)
+
+    @instrumented("projects.get_projects")
+    def get_projects(self):
+        return catalog.projects()
 
     def list_projects(self):
         try:
-            projects = self.db.query(Project).order_by(Project.name).all()
+            projects = self.get_projects()
             if not projects:
                 print("No projects found.")
                 return False
             print("\n--- Projects ---")
             for p in projects:
-                print(f"ID: {p.id}, Name: {p.name}, Client: {p.client.name}, Rate: ${p.hourly_rate:.2f}/hr")
+                print(f"ID: {p['id']}, Name: {p['name']}, Client: {p['client_name']}, Rate: ${p['hourly_rate']:.2f}/hr")
             print("----------------")
             return True
         except Exception as e:
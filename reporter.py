@@ -1,15 +1,33 @@
-import pandas as pd
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Project, TimeEntry
+import os
+import json
+import itertools
+from datetime import datetime, date, time, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from decimal import Decimal
+from sqlalchemy import select, insert, func
+import config
+from database import session_scope
+from models import Client, Project, TimeEntry, ProjectDailyTotal, utc_naive, local_naive, storage_time
 from project_manager import ProjectManager
-from file_handler import FileHandler
+from file_handler import FileHandler, COST_SCALE
+import rollup
+import partitioning
+from catalog import catalog
+from analysis_cache import AnalysisCache, bump_history_generation
+from invoice_cache import InvoiceCache
+from overlaps import OverlapChecker
+import overlaps
+from instrumentation import instrumented
+
+IMPORT_REQUIRED_FIELDS = ['project_id', 'task', 'start_time', 'end_time', 'duration_hours']
+STREAM_FETCH_SIZE = 1000
+
 
 class Reporter:
     def __init__(self, project_manager: ProjectManager, file_handler: FileHandler):
         self.project_manager = project_manager
         self.file_handler = file_handler
-        self.db: Session = SessionLocal()
+        self.invoice_cache = InvoiceCache() if config.INVOICE_CACHE else None
 
     def generate_project_summary(self):
         if not self.project_manager.list_projects():
@@ -19,36 +37,70 @@ class Reporter:
         except ValueError:
             print("Invalid input. Please enter a number.")
             return
+        period = self._prompt_period(required=False)
+        if period is None:
+            return
+        self.show_project_summary(project_id, *period)
 
+    @instrumented("reporter.show_project_summary")
+    def show_project_summary(self, project_id, start_date=None, end_date=None):
         try:
-            project = self.db.query(Project).filter(Project.id == project_id).one_or_none()
-            if not project:
-                print("Invalid project ID.")
+            summary = self.get_project_summary(project_id, start_date, end_date)
+            if summary is None:
                 return
             
-            entries = self.db.query(TimeEntry).filter(TimeEntry.project_id == project_id).order_by(TimeEntry.start_time).all()
-            
-            if not entries:
-                print(f"No time entries found for project '{project.name}'.")
-                return
-
-            total_hours = sum(entry.duration_hours for entry in entries)
-            total_cost = total_hours * project.hourly_rate
+            with session_scope() as db:
+                entries = self._stream_project_entries(db, project_id, start_date, end_date)
+                first_entry = next(entries, None)
+                if first_entry is None:
+                    print(f"No time entries found for project '{summary['project']}'.")
+                    return
 
-            print(f"\n--- Summary for Project: {project.name} ---")
-            print(f"Hourly Rate: ${project.hourly_rate:.2f}/hr")
-            print("\nTime Entries:")
-            for entry in entries:
-                print(f"  - Task: {entry.task}, Duration: {float(entry.duration_hours):.2f} hours (from {entry.start_time.strftime('%Y-%m-%d %H:%M')} to {entry.end_time.strftime('%H:%M')})")
+                print(f"\n--- Summary for Project: {summary['project']} ---")
+                if start_date or end_date:
+                    print(f"Period: {start_date or 'start'} to {end_date or 'today'}")
+                print(f"Hourly Rate: ${summary['hourly_rate']:.2f}/hr")
+                print("\nTime Entries:")
+                for entry in itertools.chain([first_entry], entries):
+                    print(f"  - Task: {entry.task}, Duration: {entry.duration_units / rollup.HOURS_SCALE:.2f} hours (from {entry.start_time.strftime('%Y-%m-%d %H:%M')} to {entry.end_time.strftime('%H:%M')})")
 
             print("\n--- Totals ---")
-            print(f"Total Billable Hours: {float(total_hours):.2f}")
-            print(f"Total Project Cost: ${float(total_cost):.2f}")
+            print(f"Total Billable Hours: {float(summary['total_hours']):.2f}")
+            print(f"Total Project Cost: ${float(summary['total_cost']):.2f}")
             print("--------------")
-            self.file_handler.log_activity(f"Generated summary for project '{project.name}'.")
+            self.file_handler.log_activity(f"Generated summary for project '{summary['project']}'.")
         except Exception as error:
             print("Error generating summary:", error)
 
+    @instrumented("reporter.get_project_summary")
+    def get_project_summary(self, project_id, start_date=None, end_date=None):
+        project = catalog.get_project(project_id)
+        if not project:
+            print("Invalid project ID.")
+            return None
+
+        filters = [ProjectDailyTotal.project_id == project_id, *_rollup_period_filters(start_date, end_date)]
+
+        with session_scope() as db:
+            total_hours, total_cost, entry_count = db.execute(
+                select(
+                    func.sum(ProjectDailyTotal.hours),
+                    func.sum(ProjectDailyTotal.cost),
+                    func.sum(ProjectDailyTotal.entry_count)
+                ).where(*filters)
+            ).one()
+            return {
+                'project_id': project['id'],
+                'start_date': start_date,
+                'end_date': end_date,
+                'project': project['name'],
+                'client': project['client_name'],
+                'hourly_rate': project['hourly_rate'],
+                'total_hours': total_hours or 0,
+                'total_cost': total_cost or 0,
+                'entry_count': entry_count or 0,
+            }
+
     def export_invoice_csv(self):
         if not self.project_manager.list_projects():
             return
@@ -57,74 +109,493 @@ class Reporter:
         except ValueError:
             print("Invalid input. Please enter a number.")
             return
+        period = self._prompt_period(required=False)
+        if period is None:
+            return
+        self.export_invoice(project_id, *period)
 
+    @instrumented("reporter.export_invoice")
+    def export_invoice(self, project_id, start_date=None, end_date=None, force=False):
+        if (start_date is None) != (end_date is None):
+            print("An invoice period needs both a start and an end date.")
+            return None
         try:
-            project = self.db.query(Project).filter(Project.id == project_id).one_or_none()
+            project = catalog.get_project(project_id)
             if not project:
                 print("Invalid project ID.")
-                return
-            
-            entries = self.db.query(TimeEntry).filter(TimeEntry.project_id == project_id).order_by(TimeEntry.start_time).all()
-            
-            if not entries:
-                print(f"No time entries to invoice for project '{project.name}'.")
-                return
+                return None
             
-            project_details = {'name': project.name, 'hourly_rate': project.hourly_rate}
-            self.file_handler.export_invoice_to_csv(project_details, project.client.name, entries)
+            project_details = {'name': project['name'], 'hourly_rate': project['hourly_rate']}
+            with session_scope() as db:
+                if self.invoice_cache:
+                    return self._export_cached_invoice(db, project, start_date, end_date, force)
+                entries = self._stream_project_entries(db, project_id, start_date, end_date)
+                first_entry = next(entries, None)
+                if first_entry is None:
+                    print(f"No time entries to invoice for project '{project['name']}'.")
+                    return None
+                
+                period = (start_date, end_date) if start_date else None
+                return self.file_handler.export_invoice_to_csv(project_details, project['client_name'], itertools.chain([first_entry], entries), period)
 
         except Exception as error:
             print("Error exporting invoice:", error)
+            return None
+
+    def _export_cached_invoice(self, db, project, start_date, end_date, force):
+        period = (start_date, end_date) if start_date else None
+        states = self._invoice_states(db, start_date, end_date, project['id'])
+        if not states:
+            print(f"No time entries to invoice for project '{project['name']}'.")
+            return None
+        state = states[0]
+        result = self._reuse_invoice(db, state, period, force)
+        if result is None:
+            project_details = {'name': state.project_name, 'hourly_rate': state.hourly_rate}
+            entries = self._stream_project_entries(db, state.project_id, start_date, end_date)
+            layout = {}
+            result = self.file_handler.export_invoice_to_csv(project_details, state.client_name, entries, period, layout)
+            if result:
+                self._remember_invoice(state, period, layout)
+        self.invoice_cache.save()
+        return result
+
+    def _invoice_states(self, db, start_date, end_date, project_id=None):
+        # The fingerprint of each project's entry set for the period: count,
+        # highest id and billed hours, read through the (project_id, start_time) index.
+        filters = _period_filters(start_date, end_date)
+        if project_id is not None:
+            filters.append(TimeEntry.project_id == project_id)
+        return db.execute(
+            select(
+                Project.id.label('project_id'),
+                Client.name.label('client_name'),
+                Project.name.label('project_name'),
+                Project.hourly_rate,
+                func.count(TimeEntry.id).label('entry_count'),
+                func.max(TimeEntry.id).label('max_id'),
+                func.sum(rollup.duration_units()).label('total_units')
+            ).join(Project, TimeEntry.project_id == Project.id)
+            .join(Client, Project.client_id == Client.id)
+            .where(*filters)
+            .group_by(Project.id, Client.name, Project.name, Project.hourly_rate)
+            .order_by(Client.name, Project.id)
+        ).all()
+
+    def _reuse_invoice(self, db, state, period, force):
+        # Returns the invoice when the file already on disk could be kept as it is
+        # or extended with entries added since; None when it has to be rewritten.
+        if force:
+            return None
+        project_details = {'name': state.project_name, 'hourly_rate': state.hourly_rate}
+        file_path = self.file_handler.invoice_path(project_details, state.client_name, period)
+        cached = self.invoice_cache.get(InvoiceCache.key(state.project_id, period), file_path)
+        if not cached or cached['rate'] != rollup.rate_units(state.hourly_rate):
+            return None
+        if (cached['entry_count'], cached['max_id'], cached['total_units']) == (state.entry_count, state.max_id, state.total_units):
+            print(f"Invoice {file_path} is up to date.")
+            return _invoice_result(cached)
+        if state.entry_count <= cached['entry_count'] or state.max_id <= cached['max_id']:
+            return None
+
+        # Appending is only right if every change is a new entry (a higher id)
+        # that sorts after the rows already in the file.
+        start_date, end_date = period or (None, None)
+        new_entries = list(self._stream_project_entries(db, state.project_id, start_date, end_date, after_id=cached['max_id']))
+        if (
+            len(new_entries) != state.entry_count - cached['entry_count']
+            or sum(entry.duration_units for entry in new_entries) != state.total_units - cached['total_units']
+            or new_entries[0].start_time < datetime.fromisoformat(cached['last_start'])
+        ):
+            return None
+        layout = self.file_handler.append_invoice_rows(project_details, cached, new_entries)
+        if layout is None:
+            return None
+        self.invoice_cache.put(InvoiceCache.key(state.project_id, period), layout)
+        return _invoice_result(layout)
+
+    def _remember_invoice(self, state, period, layout):
+        self.invoice_cache.put(
+            InvoiceCache.key(state.project_id, period),
+            dict(layout, rate=rollup.rate_units(state.hourly_rate))
+        )
+
+    def stream_invoice(self, project_id, start_date=None, end_date=None):
+        # Same rows as export_invoice, produced lazily for callers that send them on
+        # instead of writing a file. The session stays open until the rows run out.
+        project = catalog.get_project(project_id)
+        if not project:
+            print("Invalid project ID.")
+            return None
+        return self._invoice_rows(project, start_date, end_date)
+
+    def _invoice_rows(self, project, start_date, end_date):
+        project_details = {'name': project['name'], 'hourly_rate': project['hourly_rate']}
+        with session_scope() as db:
+            entries = self._stream_project_entries(db, project['id'], start_date, end_date)
+            yield from self.file_handler.invoice_rows(project_details, project['client_name'], entries, {})
+
+    def batch_export_invoices(self):
+        period = self._prompt_period(required=True)
+        if period is None:
+            return
+        self.export_invoices_for_period(*period)
+
+    def _prompt_period(self, required):
+        hint = "YYYY-MM-DD" if required else "YYYY-MM-DD, blank for all"
+        try:
+            start_text = input(f"Enter the billing period start date ({hint}): ").strip()
+            end_text = input(f"Enter the billing period end date ({hint}): ").strip()
+            start_date = datetime.strptime(start_text, '%Y-%m-%d').date() if start_text or required else None
+            end_date = datetime.strptime(end_text, '%Y-%m-%d').date() if end_text or required else None
+        except ValueError:
+            print("Invalid date. Please use the YYYY-MM-DD format.")
+            return None
+        if start_date and end_date and end_date < start_date:
+            print("The end date must not be before the start date.")
+            return None
+        return start_date, end_date
+
+    @instrumented("reporter.export_invoices_for_period")
+    def export_invoices_for_period(self, start_date, end_date, workers=None, force=False):
+        period = (start_date, end_date)
+        invoices = []
+        try:
+            with session_scope() as db:
+                # With the invoice cache, unchanged and extendable invoices are
+                # settled first; only the rest are streamed and rewritten.
+                slots = {}
+                order = None
+                stale = None
+                if self.invoice_cache:
+                    states = self._invoice_states(db, start_date, end_date)
+                    order = [state.project_id for state in states]
+                    stale = {}
+                    for state in states:
+                        result = self._reuse_invoice(db, state, period, force)
+                        if result:
+                            slots[state.project_id] = (state.client_name, state.project_name, result, None)
+                        else:
+                            stale[state.project_id] = state
+                filters = _period_filters(start_date, end_date)
+                if stale is not None:
+                    filters.append(TimeEntry.project_id.in_(list(stale)))
+                rows = [] if stale == {} else db.execute(
+                    select(
+                        Client.name.label('client_name'),
+                        Project.id.label('project_id'),
+                        Project.name.label('project_name'),
+                        Project.hourly_rate,
+                        TimeEntry.id,
+                        TimeEntry.task,
+                        TimeEntry.start_time,
+                        TimeEntry.end_time,
+                        rollup.duration_units().label('duration_units')
+                    ).join(Project, TimeEntry.project_id == Project.id)
+                    .join(Client, Project.client_id == Client.id)
+                    .where(*filters)
+                    .order_by(Client.name, Project.id, TimeEntry.start_time)
+                    .execution_options(yield_per=STREAM_FETCH_SIZE)
+                )
+
+                workers = workers or config.INVOICE_WORKERS
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    in_flight = set()
+                    for project_id, group in itertools.groupby(rows, key=lambda row: row.project_id):
+                        # Each queued future holds its project's entries, so the
+                        # reader waits once a couple of rounds are queued.
+                        if len(in_flight) >= workers * 2:
+                            _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        entries = list(group)
+                        first = entries[0]
+                        project_details = {'name': first.project_name, 'hourly_rate': first.hourly_rate}
+                        layout = {}
+                        future = pool.submit(self.file_handler.export_invoice_to_csv, project_details, first.client_name, entries, period, layout)
+                        in_flight.add(future)
+                        slots[project_id] = (first.client_name, first.project_name, future, layout)
+                    for project_id in order or list(slots):
+                        if project_id not in slots:
+                            continue
+                        client_name, project_name, result, layout = slots[project_id]
+                        if layout is not None:
+                            result = result.result()
+                            if result and self.invoice_cache:
+                                self._remember_invoice(stale[project_id], period, layout)
+                        if result:
+                            invoices.append(dict(result, client=client_name, project=project_name))
+                if self.invoice_cache:
+                    self.invoice_cache.save()
+        except Exception as error:
+            print("Error exporting invoices:", error)
+            return None
+
+        if not invoices:
+            print("No time entries to invoice for this period.")
+            return None
+        manifest_path = self.file_handler.write_invoice_manifest(period, invoices)
+        print(f"Exported {len(invoices)} invoices for {start_date} to {end_date}. Manifest: {manifest_path}")
+        return {'manifest': manifest_path, 'invoices': invoices}
+
+    def _stream_project_entries(self, db, project_id, start_date=None, end_date=None, after_id=None):
+        # Plain rows rather than TimeEntry objects: reports only need these columns.
+        filters = _period_filters(start_date, end_date)
+        if after_id is not None:
+            filters.append(TimeEntry.id > after_id)
+        return iter(db.execute(
+            select(
+                TimeEntry.id,
+                TimeEntry.task,
+                TimeEntry.start_time,
+                TimeEntry.end_time,
+                rollup.duration_units().label('duration_units')
+            )
+            .where(TimeEntry.project_id == project_id, *filters)
+            .order_by(TimeEntry.start_time)
+            .execution_options(yield_per=STREAM_FETCH_SIZE)
+        ))
 
     def import_time_entries_from_json(self):
         file_path = input("Enter the full path to the JSON file to import: ")
-        new_entries_data = self.file_handler.import_json_file(file_path)
-        if new_entries_data is None:
-            return
+        self.import_entries_file(file_path)
+
+    @instrumented("reporter.import_entries_file")
+    def import_entries_file(self, file_path, batch_size=None, overlap_policy=None):
+        if not os.path.exists(file_path):
+            print(f"Error: File not found at '{file_path}'")
+            return None
+        batch_size = batch_size or config.IMPORT_BATCH_SIZE
+        checkpoint_path = f"{file_path}.checkpoint"
+        rejects_path = f"{file_path}.rejected.jsonl"
 
-        imported_count = 0
+        checkpoint = self.file_handler.read_checkpoint(checkpoint_path)
+        if checkpoint:
+            print(f"Resuming import after {checkpoint['rows_processed']} rows.")
+            checkpoint.setdefault('duplicates', 0)
+            checkpoint.setdefault('clipped', 0)
+        else:
+            checkpoint = {'rows_processed': 0, 'imported': 0, 'duplicates': 0, 'clipped': 0, 'rejected': 0}
+            if os.path.exists(rejects_path):
+                os.remove(rejects_path)
+
+        batch, rejected = [], []
         try:
-            for entry_data in new_entries_data:
-                if all(k in entry_data for k in ['project_id', 'task', 'start_time', 'end_time', 'duration_hours']):
-                    new_entry = TimeEntry(**entry_data)
-                    self.db.add(new_entry)
-                    imported_count += 1
-                else:
-                    print(f"Skipping invalid entry: {entry_data}")
-            self.db.commit()
-            self.file_handler.log_activity(f"Imported {imported_count} time entries from {file_path}.")
-            print(f"Successfully imported {imported_count} time entries into the database.")
+            with session_scope() as db:
+                project_ids = {project['id'] for project in catalog.projects()}
+                checker = OverlapChecker(db, overlap_policy)
+                for index, entry_data in self.file_handler.iter_json_array(file_path, skip=checkpoint['rows_processed']):
+                    row, reason = self._validate_entry(entry_data, project_ids)
+                    if row is None:
+                        rejected.append((index, reason, entry_data))
+                    else:
+                        batch.append((index, entry_data, row))
+                    if len(batch) + len(rejected) >= batch_size:
+                        self._commit_import_batch(db, checker, batch, rejected, checkpoint, checkpoint_path, rejects_path)
+                        batch, rejected = [], []
+                self._commit_import_batch(db, checker, batch, rejected, checkpoint, checkpoint_path, rejects_path)
+        except (ValueError, json.JSONDecodeError) as error:
+            print(f"Error: Could not decode JSON after {checkpoint['rows_processed']} rows: {error}")
+            return None
         except Exception as error:
-            self.db.rollback()
             print("Error during database import:", error)
+            print(f"{checkpoint['imported']} entries were committed; run the import again to resume.")
+            return None
+
+        self.file_handler.clear_checkpoint(checkpoint_path)
+        self.file_handler.log_activity(f"Imported {checkpoint['imported']} time entries from {file_path}.")
+        print(f"Successfully imported {checkpoint['imported']} time entries into the database.")
+        if checkpoint['duplicates']:
+            print(f"Skipped {checkpoint['duplicates']} entries that were already imported.")
+        if checkpoint['clipped']:
+            print(f"Trimmed {checkpoint['clipped']} entries to the time not already logged.")
+        if checkpoint['rejected']:
+            print(f"Skipped {checkpoint['rejected']} invalid or overlapping entries; see {rejects_path}.")
+        return {
+            'file': file_path,
+            'imported': checkpoint['imported'],
+            'duplicates': checkpoint['duplicates'],
+            'clipped': checkpoint['clipped'],
+            'rejected': checkpoint['rejected'],
+            'rejected_file': rejects_path if checkpoint['rejected'] else None,
+        }
+
+    def _validate_entry(self, entry_data, project_ids):
+        if not isinstance(entry_data, dict):
+            return None, "entry is not an object"
+        missing = [k for k in IMPORT_REQUIRED_FIELDS if k not in entry_data]
+        if missing:
+            return None, f"missing fields: {', '.join(missing)}"
+        try:
+            row = {
+                'project_id': int(entry_data['project_id']),
+                'task': entry_data['task'],
+                'start_time': storage_time(datetime.fromisoformat(entry_data['start_time'])),
+                'end_time': storage_time(datetime.fromisoformat(entry_data['end_time'])),
+                'duration_hours': Decimal(str(entry_data['duration_hours'])),
+            }
+        except (TypeError, ValueError, ArithmeticError) as error:
+            return None, f"invalid value: {error}"
+        if row['project_id'] not in project_ids:
+            return None, f"unknown project ID {row['project_id']}"
+        if row['end_time'] < row['start_time']:
+            return None, "end_time is before start_time"
+        if row['duration_hours'] < 0:
+            return None, "negative duration_hours"
+        row['fingerprint'] = TimeEntry.fingerprint_for(row['project_id'], row['start_time'], row['end_time'], row['task'])
+        return row, None
+
+    def _commit_import_batch(self, db, checker, batch, rejected, checkpoint, checkpoint_path, rejects_path):
+        if not batch and not rejected:
+            return
+        processed = len(batch) + len(rejected)
+        batch = self._drop_duplicates(db, batch)
+        duplicates = processed - len(rejected) - len(batch)
+        rows, clipped = [], 0
+        for (index, entry_data, row), (pieces, reason) in zip(batch, checker.check([row for _, _, row in batch])):
+            if reason:
+                rejected.append((index, reason, entry_data))
+                continue
+            if not pieces:
+                duplicates += 1
+            elif pieces != [row]:
+                clipped += 1
+            rows.extend(pieces)
+        batch = rows
+        if batch:
+            start_times = [utc_naive(row['start_time']) for row in batch]
+            partitioning.ensure_partitions(local_naive(min(start_times)), local_naive(max(start_times)), connection=db.connection())
+            db.execute(insert(TimeEntry), batch)
+            rollup.apply_entries(db, batch)
+            bump_history_generation(db)
+        db.commit()
+        if rejected:
+            self.file_handler.append_rejected_rows(rejects_path, rejected)
+        checkpoint['rows_processed'] += processed
+        checkpoint['imported'] += len(batch)
+        checkpoint['duplicates'] += duplicates
+        checkpoint['clipped'] += clipped
+        checkpoint['rejected'] += len(rejected)
+        self.file_handler.write_checkpoint(checkpoint_path, checkpoint)
+        print(f"  ... {checkpoint['rows_processed']} rows processed ({checkpoint['imported']} imported, "
+              f"{checkpoint['duplicates']} duplicates, {checkpoint['rejected']} rejected)")
+
+    def _drop_duplicates(self, db, batch):
+        # Repeats inside the batch are dropped first, then one query finds the
+        # fingerprints already stored; the start_time bounds let partitions be pruned.
+        unique_rows = {}
+        for item in batch:
+            unique_rows.setdefault(item[2]['fingerprint'], item)
+        if not unique_rows:
+            return []
+        # A file may mix naive and aware times.
+        start_times = [utc_naive(row['start_time']) for _, _, row in unique_rows.values()]
+        existing = set(db.scalars(
+            select(TimeEntry.fingerprint).where(
+                TimeEntry.fingerprint.in_(list(unique_rows)),
+                TimeEntry.start_time >= local_naive(min(start_times)),
+                TimeEntry.start_time <= local_naive(max(start_times))
+            )
+        ))
+        return [item for fingerprint, item in unique_rows.items() if fingerprint not in existing]
+
+    @instrumented("reporter.get_analysis")
+    def get_analysis(self, start_date=None, end_date=None):
+        if start_date is None and end_date is None:
+            return self._get_cached_analysis()
+
+        filters = _rollup_period_filters(start_date, end_date)
+
+        with session_scope() as db:
+            project_rows = db.execute(
+                select(
+                    Project.name,
+                    func.sum(ProjectDailyTotal.hours),
+                    func.sum(ProjectDailyTotal.cost)
+                ).join(Project, ProjectDailyTotal.project_id == Project.id)
+                .where(*filters)
+                .group_by(Project.name)
+                .order_by(Project.name)
+            ).all()
+            day_rows = db.execute(
+                select(ProjectDailyTotal.day, func.sum(ProjectDailyTotal.hours))
+                .where(*filters)
+                .group_by(ProjectDailyTotal.day)
+                .order_by(ProjectDailyTotal.day)
+            ).all()
+
+        return {
+            'hours_per_project': [(name, round(float(hours), 2)) for name, hours, _ in project_rows],
+            'cost_per_project': [(name, round(float(total), 2)) for name, _, total in project_rows],
+            'hours_per_day': [(day, round(float(hours), 2)) for day, hours in day_rows],
+        }
+
+    def _get_cached_analysis(self):
+        state = AnalysisCache().totals()
+        project_totals = {}
+        for project_id, (hours, cost) in state['projects'].items():
+            project = catalog.get_project(int(project_id))
+            name = project['name'] if project else f"Project {project_id}"
+            totals = project_totals.setdefault(name, [0, 0])
+            totals[0] += hours
+            totals[1] += cost
+        names = sorted(project_totals)
+        return {
+            'hours_per_project': [(name, round(float(project_totals[name][0]), 2)) for name in names],
+            'cost_per_project': [(name, round(float(project_totals[name][1]), 2)) for name in names],
+            'hours_per_day': [(date.fromisoformat(day), round(float(state['days'][day]), 2)) for day in sorted(state['days'])],
+        }
 
-    def analyze_data(self):
-        query = self.db.query(
-            Project.name.label("project_name"),
-            TimeEntry.duration_hours,
-            Project.hourly_rate,
-            TimeEntry.start_time
-        ).join(Project, TimeEntry.project_id == Project.id).statement
+    @instrumented("reporter.rebuild_rollup")
+    def rebuild_rollup(self):
+        try:
+            with session_scope() as db:
+                day_count = rollup.rebuild(db)
+                bump_history_generation(db)
+            self.file_handler.log_activity(f"Rebuilt daily rollup ({day_count} project-days).")
+            print(f"Daily rollup rebuilt: {day_count} project-days.")
+            return {'project_days': day_count}
+        except Exception as error:
+            print("Error while rebuilding rollup:", error)
+            return None
+
+    @instrumented("reporter.audit_overlaps")
+    def audit_overlaps(self, report_path=None):
+        try:
+            with session_scope() as db:
+                stats = overlaps.audit(db, report_path)
+        except Exception as error:
+            print("Error while auditing time entries:", error)
+            return None
+        print(f"Scanned {stats['entries_scanned']} entries: {stats['overlaps']} overlap earlier entries of the same project "
+              f"({stats['overlap_hours']:.2f} hours across {stats['projects_affected']} projects). Report: {stats['report']}")
+        if stats['entries_longer_than_lookback']:
+            print(f"{stats['entries_longer_than_lookback']} entries are longer than OVERLAP_LOOKBACK_HOURS; "
+                  "imports and timers may miss overlaps with them.")
+        return stats
+
+    def analyze_data_for_period(self):
+        period = self._prompt_period(required=False)
+        if period is None:
+            return
+        self.analyze_data(*period)
 
+    @instrumented("reporter.analyze_data")
+    def analyze_data(self, start_date=None, end_date=None):
         try:
-            df = pd.read_sql(query, engine)
-            if df.empty:
+            analysis = self.get_analysis(start_date, end_date)
+            if not analysis['hours_per_project']:
                 print("No time entries to analyze.")
                 return
 
-            df['cost'] = df['duration_hours'].astype(float) * df['hourly_rate'].astype(float)
-            df['date'] = pd.to_datetime(df['start_time']).dt.date
-
             print("\n--- Data Analysis ---")
-            billable_hours = df.groupby('project_name')['duration_hours'].sum().round(2)
+            billable_hours = _as_series(analysis['hours_per_project'], 'project_name', 'duration_hours')
             print("\nTotal Billable Hours per Project:")
             print(billable_hours.to_string())
 
-            project_costs = df.groupby('project_name')['cost'].sum().round(2)
+            project_costs = _as_series(analysis['cost_per_project'], 'project_name', 'cost')
             print("\nTotal Earnings per Project:")
             print(project_costs.to_string())
 
-            daily_hours = df.groupby('date')['duration_hours'].sum().round(2)
+            daily_hours = _as_series(analysis['hours_per_day'], 'date', 'duration_hours')
             print("\nWork Trend (Total Hours per Day):")
             print(daily_hours.to_string())
             
@@ -132,3 +603,40 @@ class Reporter:
             self.file_handler.log_activity("Performed data analysis.")
         except Exception as error:
             print("Error during data analysis:", error)
+
+
+def _invoice_result(layout):
+    rate = layout['rate']
+    return {
+        'file': layout['file'],
+        'total_hours': Decimal(layout['total_units']) / rollup.HOURS_SCALE,
+        'total_cost': Decimal(layout['total_units'] * rate) / COST_SCALE
+    }
+
+
+def _period_filters(start_date, end_date):
+    # Periods are whole days in local time, matching the rollup's day buckets.
+    filters = []
+    if start_date:
+        filters.append(TimeEntry.start_time >= datetime.combine(start_date, time.min))
+    if end_date:
+        filters.append(TimeEntry.start_time < datetime.combine(end_date + timedelta(days=1), time.min))
+    return filters
+
+
+def _rollup_period_filters(start_date, end_date):
+    filters = []
+    if start_date:
+        filters.append(ProjectDailyTotal.day >= start_date)
+    if end_date:
+        filters.append(ProjectDailyTotal.day <= end_date)
+    return filters
+
+
+def _as_series(rows, index_name, value_name):
+    import pandas as pd
+    return pd.Series(
+        [value for _, value in rows],
+        index=pd.Index([key for key, _ in rows], name=index_name),
+        name=value_name
+    )
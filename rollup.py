@@ -0,0 +1,103 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import select, insert, update, delete, func, cast, Date, BigInteger
+from sqlalchemy.orm import Session
+from database import upsert_insert
+from models import Project, TimeEntry, ProjectDailyTotal, utc_naive, local_naive
+
+REBUILD_FETCH_SIZE = 10000
+HOURS_QUANTUM = Decimal('0.0001')
+# duration_hours is Numeric(10, 4) and hourly_rate Numeric(10, 2), so both fit
+# exactly in integers of 1/10000 hour and cents.
+HOURS_SCALE = 10000
+RATE_SCALE = 100
+
+DAY_BUCKET_FUNCTIONS = {
+    'postgresql': lambda column: cast(column, Date),
+    'sqlite': lambda column: func.date(column),
+    'mysql': lambda column: func.date(column),
+}
+
+
+def duration_units(column=TimeEntry.duration_hours):
+    # Scaled in SQL so the driver hands back plain ints instead of Decimals.
+    return cast(func.round(column * HOURS_SCALE), BigInteger)
+
+
+def rate_units(hourly_rate):
+    return int((Decimal(hourly_rate) * RATE_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def day_of(start_time):
+    # Local calendar day, as rebuild() buckets it; Postgres hands back aware times.
+    return local_naive(utc_naive(start_time)).date()
+
+
+def apply_entries(db: Session, entries):
+    totals = defaultdict(lambda: [0, 0])
+    for entry in entries:
+        key = (entry['project_id'], day_of(entry['start_time']))
+        totals[key][0] += Decimal(str(entry['duration_hours'])).quantize(HOURS_QUANTUM, rounding=ROUND_HALF_UP)
+        totals[key][1] += 1
+    if not totals:
+        return
+
+    project_ids = {project_id for project_id, _ in totals}
+    rates = dict(db.execute(select(Project.id, Project.hourly_rate).where(Project.id.in_(project_ids))).all())
+
+    # One upsert, so concurrent writers adding to the same day cannot both insert
+    # the row or overwrite each other's increment.
+    table = ProjectDailyTotal.__table__
+    statement = upsert_insert(table, db.get_bind().dialect.name)
+    statement = statement.on_conflict_do_update(
+        index_elements=['project_id', 'day'],
+        set_={
+            'hours': table.c.hours + statement.excluded.hours,
+            'cost': table.c.cost + statement.excluded.cost,
+            'entry_count': table.c.entry_count + statement.excluded.entry_count
+        }
+    )
+    db.execute(statement, [
+        {'project_id': project_id, 'day': day, 'hours': hours, 'cost': hours * rates[project_id], 'entry_count': count}
+        for (project_id, day), (hours, count) in totals.items()
+    ])
+
+
+def reprice(db: Session, project_ids):
+    # Rates are per project, so a rate change rescales every rollup row of that project.
+    if not project_ids:
+        return
+    rate = select(Project.hourly_rate).where(Project.id == ProjectDailyTotal.project_id).scalar_subquery()
+    db.execute(
+        update(ProjectDailyTotal)
+        .where(ProjectDailyTotal.project_id.in_(project_ids))
+        .values(cost=ProjectDailyTotal.hours * rate)
+    )
+
+
+def rebuild(db: Session):
+    db.execute(delete(ProjectDailyTotal))
+    dialect = db.get_bind().dialect.name
+    if dialect in DAY_BUCKET_FUNCTIONS:
+        day = DAY_BUCKET_FUNCTIONS[dialect](TimeEntry.start_time)
+        db.execute(
+            insert(ProjectDailyTotal).from_select(
+                ['project_id', 'day', 'hours', 'cost', 'entry_count'],
+                select(
+                    TimeEntry.project_id,
+                    day,
+                    func.sum(TimeEntry.duration_hours),
+                    func.sum(TimeEntry.duration_hours * Project.hourly_rate),
+                    func.count(TimeEntry.id)
+                ).join(Project, TimeEntry.project_id == Project.id)
+                .group_by(TimeEntry.project_id, day)
+            )
+        )
+    else:
+        # No usable date function on this backend: bucket streamed rows in Python.
+        rows = db.execute(
+            select(TimeEntry.project_id, TimeEntry.start_time, TimeEntry.duration_hours)
+            .execution_options(yield_per=REBUILD_FETCH_SIZE)
+        ).mappings()
+        apply_entries(db, rows)
+    return db.scalar(select(func.count()).select_from(ProjectDailyTotal))
@@ -0,0 +1,119 @@
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+import config
+import rollup
+import partitioning
+from database import engine, build_engine, session_scope, upsert_insert, SCHEMA_VERSION
+from models import AppMeta, Client, Project, TimeEntry
+from analysis_cache import bump_history_generation
+
+# Pushes a local (usually SQLite) database into the central one. Clients and
+# projects are matched by name, entries by fingerprint, so a push can be
+# repeated or interrupted at any point without creating duplicates. The last
+# pushed local entry id is kept per target in the local app_meta table.
+WATERMARK_KEY_PREFIX = "sync_watermark:"
+
+
+def push(central_url=None, batch_size=None):
+    central_url = central_url or config.CENTRAL_DATABASE_URL
+    batch_size = batch_size or config.SYNC_BATCH_SIZE
+    central_engine = build_engine(central_url)
+    target = central_engine.url.render_as_string(hide_password=True)
+    if target == engine.url.render_as_string(hide_password=True):
+        raise RuntimeError("The central database is the database this program is using.")
+    watermark_key = WATERMARK_KEY_PREFIX + target
+    stats = {'target': target, 'clients': 0, 'projects': 0, 'entries_sent': 0, 'entries_inserted': 0}
+
+    try:
+        with Session(central_engine, autoflush=False) as central:
+            version = central.scalar(select(AppMeta.value).where(AppMeta.key == "schema_version"))
+            if version is None or int(version) != SCHEMA_VERSION:
+                raise RuntimeError(
+                    f"The central database is at schema version {version}, expected {SCHEMA_VERSION}; "
+                    "run this program against it once to migrate it."
+                )
+            with session_scope() as local:
+                project_map = _push_catalog(local, central, stats)
+                central.commit()
+                watermark = int(local.scalar(select(AppMeta.value).where(AppMeta.key == watermark_key)) or 0)
+                rows = local.execute(
+                    select(
+                        TimeEntry.id, TimeEntry.project_id, TimeEntry.task, TimeEntry.start_time,
+                        TimeEntry.end_time, TimeEntry.duration_hours
+                    )
+                    .where(TimeEntry.id > watermark)
+                    .order_by(TimeEntry.id)
+                    .execution_options(yield_per=batch_size)
+                )
+                for batch in rows.partitions():
+                    _push_entries(central, batch, project_map, stats)
+                    # The streaming read keeps its own connection busy, so the
+                    # watermark is saved from a separate session.
+                    with session_scope() as meta:
+                        meta.merge(AppMeta(key=watermark_key, value=str(batch[-1].id)))
+                    print(f"  ... {stats['entries_sent']} entries sent ({stats['entries_inserted']} new on the server)")
+    finally:
+        central_engine.dispose()
+    print(f"Pushed {stats['entries_inserted']} new time entries to {target}.")
+    return stats
+
+
+def _push_catalog(local, central, stats):
+    dialect = central.get_bind().dialect.name
+    clients = local.execute(select(Client.id, Client.name)).all()
+    if not clients:
+        return {}
+    names = [name for _, name in clients]
+    central.execute(upsert_insert(Client, dialect).on_conflict_do_nothing(index_elements=['name']), [{'name': name} for name in names])
+    central_clients = dict(central.execute(select(Client.name, Client.id).where(Client.name.in_(names))).all())
+    client_map = {client_id: central_clients[name] for client_id, name in clients}
+    stats['clients'] = len(clients)
+
+    # Rates already on the server win; they may have been changed centrally.
+    projects = local.execute(select(Project.id, Project.client_id, Project.name, Project.hourly_rate)).all()
+    if not projects:
+        return {}
+    keys = [(client_map[client_id], name) for _, client_id, name, _ in projects]
+    central.execute(
+        upsert_insert(Project, dialect).on_conflict_do_nothing(index_elements=['client_id', 'name']),
+        [{'client_id': client_id, 'name': name, 'hourly_rate': rate} for (client_id, name), (_, _, _, rate) in zip(keys, projects)]
+    )
+    central_projects = {
+        (client_id, name): project_id
+        for project_id, client_id, name in central.execute(
+            select(Project.id, Project.client_id, Project.name).where(tuple_(Project.client_id, Project.name).in_(keys))
+        )
+    }
+    stats['projects'] = len(projects)
+    return {project_id: central_projects[key] for key, (project_id, _, _, _) in zip(keys, projects)}
+
+
+def _push_entries(central, batch, project_map, stats):
+    # Fingerprints are recomputed because they include the project id, which
+    # differs between the local and the central database.
+    values = [
+        {
+            'project_id': project_map[row.project_id],
+            'task': row.task,
+            'start_time': row.start_time,
+            'end_time': row.end_time,
+            'duration_hours': row.duration_hours,
+            'fingerprint': TimeEntry.fingerprint_for(project_map[row.project_id], row.start_time, row.end_time, row.task),
+        }
+        for row in batch
+    ]
+    start_times = [value['start_time'] for value in values]
+    partitioning.ensure_partitions(min(start_times), max(start_times), connection=central.connection())
+    # Only rows the server did not have come back, and only those go into its rollup.
+    inserted = central.execute(
+        upsert_insert(TimeEntry, central.get_bind().dialect.name)
+        .on_conflict_do_nothing(index_elements=['fingerprint', 'start_time'])
+        .returning(TimeEntry.project_id, TimeEntry.start_time, TimeEntry.duration_hours),
+        values
+    ).mappings().all()
+    if inserted:
+        rollup.apply_entries(central, inserted)
+        bump_history_generation(central)
+    central.commit()
+    stats['entries_sent'] += len(values)
+    stats['entries_inserted'] += len(inserted)
@@ -1,16 +1,36 @@
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import TimeEntry
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
+import config
+from database import session_scope
+from models import TimeEntry, ActiveTimer
 from project_manager import ProjectManager
 from file_handler import FileHandler
+import rollup
+import partitioning
+from overlaps import OverlapChecker
+from write_queue import write_queue
+from instrumentation import instrumented
 
 class TimeTracker:
-    def __init__(self, project_manager: ProjectManager, file_handler: FileHandler):
+    def __init__(self, project_manager: ProjectManager, file_handler: FileHandler, user=None):
         self.project_manager = project_manager
         self.file_handler = file_handler
-        self.db: Session = SessionLocal()
+        self.user = user or config.TRACKER_USER
         self.active_timers = {}
+        self.refresh_active_timers()
+        if self.active_timers:
+            print(f"Recovered {len(self.active_timers)} running timer(s) for user '{self.user}'.")
+
+    def refresh_active_timers(self):
+        with session_scope() as db:
+            timers = db.scalars(select(ActiveTimer).where(ActiveTimer.user_name == self.user)).all()
+            # Stops still in the write queue have not deleted their timer rows yet.
+            stopping = write_queue.pending_stops(self.user) if write_queue.enabled else set()
+            self.active_timers = {
+                timer.project_id: {"start_time": timer.start_time, "task": timer.task}
+                for timer in timers if timer.project_id not in stopping
+            }
 
     def start_timer(self):
         if not self.project_manager.list_projects():
@@ -27,13 +47,43 @@ class TimeTracker:
             return
 
         task_description = input("Enter a brief description for this task: ")
+        self.start(project_id, task_description)
+
+    @instrumented("timer.start")
+    def start(self, project_id, task_description):
+        if project_id in self.active_timers:
+            print("A timer is already running for this project.")
+            return None
+        if write_queue.enabled and project_id in write_queue.pending_stops(self.user) and not write_queue.flush():
+            print("The previous timer for this project is still being saved; try again shortly.")
+            return self._failed(project_id, "the previous timer for this project could not be saved yet")
         start_time = datetime.now()
+        try:
+            with session_scope() as db:
+                db.add(ActiveTimer(
+                    project_id=project_id,
+                    user_name=self.user,
+                    task=task_description,
+                    start_time=start_time
+                ))
+        except IntegrityError:
+            self.refresh_active_timers()
+            if project_id in self.active_timers:
+                print("A timer is already running for this project.")
+            else:
+                print("Error: Invalid project ID.")
+            return None
+        except Exception as e:
+            print("Error while starting timer:", e)
+            return self._failed(project_id, str(e))
+
         self.active_timers[project_id] = {
             "start_time": start_time,
             "task": task_description
         }
         self.file_handler.log_activity(f"Started timer for project ID {project_id} (Task: {task_description})")
         print(f"Timer started for project ID {project_id} at {start_time.strftime('%H:%M:%S')}")
+        return {'project_id': project_id, 'user': self.user, 'task': task_description, 'start_time': start_time}
 
     def stop_timer(self):
         if not self.active_timers:
@@ -50,29 +100,115 @@ class TimeTracker:
             print("Invalid input. Please enter a number.")
             return
 
+        self.stop(project_id_to_stop)
+
+    @instrumented("timer.stop")
+    def stop(self, project_id_to_stop):
+        if project_id_to_stop not in self.active_timers:
+            self.refresh_active_timers()
+            if project_id_to_stop not in self.active_timers:
+                print("No active timer found for this project ID.")
+                return None
+
         timer_data = self.active_timers.pop(project_id_to_stop)
         start_time = timer_data['start_time']
-        end_time = datetime.now()
+        end_time = datetime.now(start_time.tzinfo)
         duration_hours = (end_time - start_time).total_seconds() / 3600
+        if write_queue.enabled:
+            return self._queue_stop(project_id_to_stop, timer_data, end_time, duration_hours)
 
-        new_entry = TimeEntry(
-            project_id=project_id_to_stop,
-            task=timer_data['task'],
-            start_time=start_time,
-            end_time=end_time,
-            duration_hours=duration_hours
-        )
+        new_entry = {
+            'project_id': project_id_to_stop,
+            'task': timer_data['task'],
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration_hours': duration_hours,
+            'fingerprint': TimeEntry.fingerprint_for(project_id_to_stop, start_time, end_time, timer_data['task'])
+        }
         try:
-            self.db.add(new_entry)
-            self.db.commit()
-            self.file_handler.log_activity(f"Logged entry for project ID {project_id_to_stop}. Duration: {duration_hours:.2f} hours.")
-            print(f"Timer stopped. Logged {duration_hours:.2f} hours for project ID {project_id_to_stop}.")
+            with session_scope() as db:
+                result = db.execute(
+                    delete(ActiveTimer)
+                    .where(ActiveTimer.project_id == project_id_to_stop, ActiveTimer.user_name == self.user)
+                )
+                if result.rowcount == 0:
+                    db.rollback()
+                    print("This timer was already stopped by another session.")
+                    return None
+                checker = OverlapChecker(db)
+                entries, overlap = checker.check([new_entry])[0]
+                if entries:
+                    partitioning.ensure_partitions(start_time, end_time, connection=db.connection())
+                    db.execute(insert(TimeEntry), entries)
+                    rollup.apply_entries(db, entries)
+                else:
+                    conflict = checker.first_conflict(project_id_to_stop, start_time, end_time)
+            if overlap:
+                # The timer is gone either way; callers tell this apart from
+                # "no such timer" (None) by the 'rejected' key.
+                self.file_handler.log_activity(f"Stopped timer for project ID {project_id_to_stop} without logging it: {overlap}.")
+                print(f"Timer stopped, but nothing was logged: this time {overlap}.")
+                return {
+                    'project_id': project_id_to_stop,
+                    'user': self.user,
+                    'task': timer_data['task'],
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'duration_hours': 0,
+                    'rejected': overlap,
+                    'conflicting_entry': conflict
+                }
+            logged_hours = sum(float(entry['duration_hours']) for entry in entries)
+            self.file_handler.log_activity(f"Logged entry for project ID {project_id_to_stop}. Duration: {logged_hours:.2f} hours.")
+            print(f"Timer stopped. Logged {logged_hours:.2f} hours for project ID {project_id_to_stop}.")
+            return {
+                'project_id': project_id_to_stop,
+                'user': self.user,
+                'task': timer_data['task'],
+                'start_time': start_time,
+                'end_time': end_time,
+                'duration_hours': round(logged_hours, 4),
+                'clipped': entries != [new_entry]
+            }
         except Exception as e:
-            self.db.rollback()
             print("Error while logging time entry:", e)
             self.active_timers[project_id_to_stop] = timer_data
+            return self._failed(project_id_to_stop, str(e))
+
+    def _queue_stop(self, project_id, timer_data, end_time, duration_hours):
+        try:
+            write_queue.enqueue_stop(self.user, project_id, timer_data['task'], timer_data['start_time'], end_time, duration_hours)
+        except OSError as e:
+            print("Error while queueing time entry:", e)
+            self.active_timers[project_id] = timer_data
+            return self._failed(project_id, str(e))
+        self.file_handler.log_activity(f"Logged entry for project ID {project_id}. Duration: {duration_hours:.2f} hours.")
+        print(f"Timer stopped. Logged {duration_hours:.2f} hours for project ID {project_id}.")
+        return {
+            'project_id': project_id,
+            'user': self.user,
+            'task': timer_data['task'],
+            'start_time': timer_data['start_time'],
+            'end_time': end_time,
+            'duration_hours': round(duration_hours, 4),
+            'queued': True
+        }
+
+    def _failed(self, project_id, error):
+        # A storage failure, which callers tell apart from "no such timer" or
+        # "already running" (None) by the 'error' key; the timer is unchanged.
+        return {'project_id': project_id, 'user': self.user, 'error': error}
+
+    @instrumented("timer.get_active_timers")
+    def get_active_timers(self):
+        self.refresh_active_timers()
+        return [
+            {'project_id': project_id, 'user': self.user, 'task': data['task'], 'start_time': data['start_time']}
+            for project_id, data in self.active_timers.items()
+        ]
 
     def view_active_timers(self):
+        self.refresh_active_timers()
         if not self.active_timers:
             print("No active timers.")
             return
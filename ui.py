@@ -34,7 +34,7 @@ class UIManager:
             elif choice == '4':
                 self.reporting_menu()
             elif choice == '5':
-                self.reporter.analyze_data()
+                self.reporter.analyze_data_for_period()
             elif choice == '6':
                 print("Exiting...")
                 break
@@ -47,6 +47,7 @@ class UIManager:
             print("1. Add Client")
             print("2. List Clients")
             print("3. Back to Main Menu")
+            print("4. Bulk Load Clients from File")
             choice = input("Enter your choice: ")
             if choice == '1':
                 self.client_manager.add_client()
@@ -54,6 +55,8 @@ class UIManager:
                 self.client_manager.list_clients()
             elif choice == '3':
                 break
+            elif choice == '4':
+                self.client_manager.load_clients_from_file()
             else:
                 print("Invalid choice.")
 
@@ -63,6 +66,7 @@ class UIManager:
             print("1. Add Project")
             print("2. List Projects")
             print("3. Back to Main Menu")
+            print("4. Bulk Load Projects from File")
             choice = input("Enter your choice: ")
             if choice == '1':
                 self.project_manager.add_project()
@@ -70,6 +74,8 @@ class UIManager:
                 self.project_manager.list_projects()
             elif choice == '3':
                 break
+            elif choice == '4':
+                self.project_manager.load_projects_from_file()
             else:
                 print("Invalid choice.")
 
@@ -99,6 +105,9 @@ class UIManager:
             print("2. Export Invoice to CSV")
             print("3. Import Time Entries from JSON")
             print("4. Back to Main Menu")
+            print("5. Batch Export Invoices for Period")
+            print("6. Rebuild Reporting Rollup")
+            print("7. Audit Overlapping Time Entries")
             choice = input("Enter your choice: ")
             if choice == '1':
                 self.reporter.generate_project_summary()
@@ -108,5 +117,11 @@ class UIManager:
                 self.reporter.import_time_entries_from_json()
             elif choice == '4':
                 break
+            elif choice == '5':
+                self.reporter.batch_export_invoices()
+            elif choice == '6':
+                self.reporter.rebuild_rollup()
+            elif choice == '7':
+                self.reporter.audit_overlaps()
             else:
                 print("Invalid choice.")
\ No newline at end of file
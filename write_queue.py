@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import atexit
+import threading
+import uuid
+from contextlib import contextmanager
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import delete, tuple_
+import config
+import rollup
+import partitioning
+from overlaps import OverlapChecker
+from database import session_scope, upsert_insert
+from models import TimeEntry, ActiveTimer
+from analysis_cache import bump_history_generation
+from instrumentation import instrumentation
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Stopped timers are appended to a local journal (fsynced) and committed to the
+# database by a background thread in batches. Every record has a unique id and
+# the .ack file lists the ids known to be committed; anything else is replayed
+# on start-up. Several processes may share the journal: appends, acks and
+# compaction hold an exclusive flock on it, and the journal is only emptied
+# once every record in it is acknowledged. A batch committed just before a
+# crash (or by another process replaying it) no longer has its timer rows, so
+# it is skipped; the fingerprint index is a second guard. Without fcntl the
+# journal must not be shared.
+
+MAX_RETRY_DELAY = 60.0
+
+
+class WriteQueue:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._pending = deque()
+        self._thread = None
+        self._closed = False
+        self._journal = None
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def enable(self, path=None, flush_interval=None, batch_size=None, fsync=None):
+        if self.enabled:
+            return
+        self.path = path or config.WRITE_QUEUE_FILE
+        self.ack_path = f"{self.path}.ack"
+        self.flush_interval = config.WRITE_QUEUE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or config.WRITE_QUEUE_BATCH_SIZE
+        self.fsync = config.WRITE_QUEUE_FSYNC if fsync is None else fsync
+        self._journal = open(self.path, 'a')
+        with self._file_lock():
+            if self._replay():
+                self._journal.write("\n")
+                self._journal.flush()
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name="write-queue-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        if self._pending:
+            print(f"Replaying {len(self._pending)} queued time entries.")
+            self._wake.set()
+
+    def enqueue_stop(self, user, project_id, task, start_time, end_time, duration_hours):
+        record = {
+            'op': 'stop',
+            'user': user,
+            'project_id': project_id,
+            'task': task,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration_hours': str(duration_hours),
+            'fingerprint': TimeEntry.fingerprint_for(project_id, start_time, end_time, task),
+            'id': uuid.uuid4().hex,
+        }
+        with self._lock, self._file_lock():
+            self._journal.write(json.dumps(record) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return record['id']
+
+    def pending_stops(self, user):
+        with self._lock:
+            return {record['project_id'] for record in self._pending if record['user'] == user}
+
+    def flush(self):
+        # Writes everything queued so far; returns False if the database refused.
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if not self._flush_batch():
+                return False
+
+    def stats(self):
+        with self._lock:
+            oldest = self._pending[0]['end_time'] if self._pending else None
+            depth = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'depth': depth,
+            'oldest_pending_end_time': oldest,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_flush_ms': round(self.last_flush_seconds * 1000, 3),
+            'max_flush_ms': round(self.max_flush_seconds * 1000, 3),
+            'avg_flush_ms': round(self.total_flush_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+        }
+
+    def close(self):
+        if not self.enabled or self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        if not self.flush():
+            print(f"{len(self._pending)} time entries are still queued in {self.path}; they will be written on the next start.")
+        self._journal.close()
+
+    def _run(self):
+        delay = self.flush_interval
+        while not self._closed:
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._closed:
+                break
+            if self.flush():
+                delay = self.flush_interval
+            else:
+                # Database unreachable: back off, the journal keeps the entries.
+                delay = min(max(delay, self.flush_interval, 0.5) * 2, MAX_RETRY_DELAY)
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)[:self.batch_size]
+            if not batch:
+                return True
+            started = time.perf_counter()
+            try:
+                with instrumentation.operation("write_queue.flush"):
+                    self._commit(batch)
+            except Exception as error:
+                self.failures += 1
+                self.last_error = str(error)
+                print("Error writing queued time entries:", error)
+                return False
+            elapsed = time.perf_counter() - started
+            self._write_ack([record['id'] for record in batch])
+            with self._lock:
+                for _ in batch:
+                    self._pending.popleft()
+                if not self._pending:
+                    self._compact()
+            self.flushed += len(batch)
+            self.batches += 1
+            self.last_error = None
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+            return True
+
+    def _commit(self, batch):
+        with session_scope() as db:
+            # Only stops whose timer row is still there are written: a timer can be
+            # stopped by another session, and after a crash the row of a batch that
+            # was already committed is gone (its entries are then skipped as well).
+            timers = ActiveTimer.__table__
+            stopped = set(db.execute(
+                delete(timers)
+                .where(tuple_(timers.c.user_name, timers.c.project_id).in_([(record['user'], record['project_id']) for record in batch]))
+                .returning(timers.c.user_name, timers.c.project_id)
+            ).tuples())
+            skipped = sum(1 for record in batch if (record['user'], record['project_id']) not in stopped)
+            if skipped:
+                print(f"Skipped {skipped} queued stop(s) for timers that were no longer running.")
+            entries = self._entries([record for record in batch if (record['user'], record['project_id']) in stopped])
+            checked = OverlapChecker(db).check(entries)
+            rejected = sum(1 for _, overlap in checked if overlap)
+            if rejected:
+                print(f"Did not log {rejected} queued stop(s) that overlap time already logged.")
+            entries = [piece for pieces, _ in checked for piece in pieces]
+            if not entries:
+                return
+            start_times = [entry['start_time'] for entry in entries]
+            partitioning.ensure_partitions(min(start_times), max(start_times), connection=db.connection())
+            inserted = db.execute(
+                upsert_insert(TimeEntry)
+                .on_conflict_do_nothing(index_elements=['fingerprint', 'start_time'])
+                .returning(TimeEntry.project_id, TimeEntry.start_time, TimeEntry.duration_hours),
+                entries
+            ).mappings().all()
+            if inserted:
+                rollup.apply_entries(db, inserted)
+                bump_history_generation(db)
+
+    def _entries(self, records):
+        return [
+            {
+                'project_id': record['project_id'],
+                'task': record['task'],
+                'start_time': datetime.fromisoformat(record['start_time']),
+                'end_time': datetime.fromisoformat(record['end_time']),
+                'duration_hours': Decimal(record['duration_hours']),
+                'fingerprint': record['fingerprint'],
+            }
+            for record in records
+        ]
+
+    @contextmanager
+    def _file_lock(self):
+        # Serialises journal and ack file access between processes; threads of
+        # this process are serialised by the callers' own locks.
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_UN)
+
+    def _write_ack(self, ids):
+        with self._file_lock():
+            with open(self.ack_path, 'a') as f:
+                f.write("".join(f"{record_id}\n" for record_id in ids))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _compact(self):
+        # Start an empty journal once every record in it, this process's or
+        # another's, is committed.
+        with self._file_lock():
+            acked = self._read_acks()
+            if any(record['id'] not in acked for record in self._read_journal()):
+                return
+            self._journal.truncate(0)
+            self._journal.seek(0)
+            with open(self.ack_path, 'w'):
+                pass
+
+    def _read_acks(self):
+        if not os.path.exists(self.ack_path):
+            return set()
+        with open(self.ack_path) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _read_journal(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append; it was never acknowledged to the user.
+                    continue
+                if 'id' not in record:
+                    record['id'] = f"seq-{record['seq']}"
+                yield record
+
+    def _replay(self):
+        # Returns True when the journal ends in a partial line. Called under the file lock.
+        acked = self._read_acks()
+        records = list(self._read_journal())
+        legacy = [value for value in acked if value.isdigit() and len(value) < 32]
+        if legacy:
+            # Older journals acknowledged everything up to one sequence number.
+            acked = {record['id'] for record in records if record.get('seq', 0) <= int(legacy[0])}
+        # Rewritten with only the ids still in the journal, which also drops a
+        # torn last line that the next append would otherwise run into.
+        acked &= {record['id'] for record in records}
+        tmp_path = f"{self.ack_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("".join(f"{record_id}\n" for record_id in acked))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.ack_path)
+        self._pending.extend(record for record in records if record['id'] not in acked)
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+write_queue = WriteQueue()